@@ -7,6 +7,9 @@ set -e
 artifacts_dir="${1:-artifacts}"
 new_manifest="$artifacts_dir/manifest.yaml"
 
+# The build runs from a service directory, so repository paths are resolved from this script
+repo_root="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+
 initialize_artifacts_directory() {
     rm -rf "$artifacts_dir"
     mkdir -p "$artifacts_dir"
@@ -41,6 +44,38 @@ build_template() {
     return 0
 }
 
+precompile_templates() {
+    # Ship fresh_webhook with its Jinja templates precompiled into Python modules. Only the
+    # monitoring-baseline service contains the function.
+    if [ "$(basename "$PWD")" != "monitoring-baseline" ]; then
+        return 0
+    fi
+
+    local lambda_dir="$repo_root/services/monitoring-baseline/operations/lambdas/fresh_webhook"
+    if [ ! -d "$lambda_dir" ]; then
+        echo "Error: fresh_webhook directory '$lambda_dir' does not exist" >&2
+        return 1
+    fi
+
+    # Compile with the Jinja version the function ships with; boto3 brings python-dateutil.
+    # Dependencies go to a scratch directory so the build environment is left untouched
+    local deps_dir
+    deps_dir=$(mktemp -d)
+    echo "Installing fresh_webhook dependencies for template precompilation" >&2
+    if ! python3 -m pip install --quiet --target "$deps_dir" -r "$lambda_dir/requirements.txt" boto3; then
+        echo "Error: Failed to install fresh_webhook dependencies" >&2
+        rm -rf "$deps_dir"
+        return 1
+    fi
+
+    if ! (cd "$lambda_dir" && PYTHONPATH="$deps_dir" python3 -m fresh_webhook.compile_templates); then
+        echo "Error: Failed to precompile fresh_webhook templates" >&2
+        rm -rf "$deps_dir"
+        return 1
+    fi
+    rm -rf "$deps_dir"
+}
+
 update_manifest_template() {
     local manifest_file="$1"
     local portfolio_name="$2"
@@ -118,6 +153,10 @@ main() {
         return 1
     fi
     
+    if ! precompile_templates; then
+        return 1
+    fi
+
     if ! process_portfolios; then
         has_errors=1
     fi    
@@ -0,0 +1,31 @@
+"""Precompile the Jinja templates into Python modules shipped with the function.
+
+Run from the lambda directory before building:
+
+    python -m fresh_webhook.compile_templates
+
+EventFormatter loads the compiled modules with a ModuleLoader when they were compiled by the
+same Jinja version it runs with, and falls back to the template sources otherwise.
+"""
+import os
+import json
+import shutil
+import jinja2
+from jinja2 import FileSystemLoader
+
+from fresh_webhook.event_dispatcher import (
+    COMPILED_TEMPLATES_DIR, COMPILED_VERSION_FILE, TEMPLATES_DIR, EventFormatter
+)
+
+
+def compile_templates(target=COMPILED_TEMPLATES_DIR):
+    shutil.rmtree(target, ignore_errors=True)
+    env = EventFormatter.create_environment(FileSystemLoader(TEMPLATES_DIR))
+    env.compile_templates(target, zip=None, ignore_errors=False)
+    with open(os.path.join(target, COMPILED_VERSION_FILE), 'w') as version_file:
+        json.dump({'jinja2': jinja2.__version__}, version_file)
+    print(f"Compiled templates from {TEMPLATES_DIR} into {target}")
+
+
+if __name__ == '__main__':
+    compile_templates()
@@ -1,49 +1,93 @@
 import os
 import json
+import threading
 from datetime import datetime
 from dateutil import parser
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+import jinja2
+from jinja2 import Environment, FileSystemLoader, ModuleLoader, select_autoescape
 
 from fresh_webhook.event_sources.cloudwatch_fields import CloudwatchFields
 from fresh_webhook.event_sources.eventbridge_fields import EventBridgeFields
 from fresh_webhook.helpers import aws_helpers, fresh_helpers
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# Templates precompiled into Python modules by `python -m fresh_webhook.compile_templates`
+COMPILED_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates_compiled')
+COMPILED_VERSION_FILE = 'jinja_version.json'
+
+
+def compiled_templates_available(compiled_dir=COMPILED_TEMPLATES_DIR):
+    """Precompiled templates are only used when compiled by the Jinja version that renders them."""
+    try:
+        with open(os.path.join(compiled_dir, COMPILED_VERSION_FILE)) as version_file:
+            return json.load(version_file).get('jinja2') == jinja2.__version__
+    except (OSError, ValueError):
+        return False
+
 
 class EventFormatter:
-    def __init__(self):
-        self.env = self._setup_jinja_env()
-        self.template = self._load_template()
-    
-    def _setup_jinja_env(self):
+    def __init__(self, loader=None):
+        self.env = self.create_environment(loader or self._get_loader())
+        self.templates = {}
+        self.template = self.get_template('event.html.j2')
+
+    @staticmethod
+    def create_environment(loader):
         env = Environment(
-            loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
+            loader=loader,
             autoescape=select_autoescape(['html', 'xml']),
             trim_blocks=True,
-            lstrip_blocks=True
+            lstrip_blocks=True,
+            # Templates ship with the function, so skip the per-render file modification check
+            auto_reload=False
         )
         env.filters['tojson'] = lambda obj, **kwargs: json.dumps(obj, indent=2)
         env.filters['datetime'] = lambda dt: dt if not dt else parser.parse(str(dt)).strftime("%Y-%m-%d %H:%M:%S %Z")
         env.globals['now'] = lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S %Z")
         return env
-    
-    def _load_template(self):
-        return self.env.get_template('event.html.j2')
+
+    def _get_loader(self):
+        if compiled_templates_available():
+            print("Using precompiled templates")
+            return ModuleLoader(COMPILED_TEMPLATES_DIR)
+        return FileSystemLoader(TEMPLATES_DIR)
+
+    def get_template(self, name):
+        # Compiled templates are kept for the lifetime of the process
+        template = self.templates.get(name)
+        if template is None:
+            template = self.templates[name] = self.env.get_template(name)
+        return template
     
     def format_event(self, event):
         return self.template.render(event=event)
 
 
+_formatter = None
+_formatter_lock = threading.Lock()
+
+
+def get_event_formatter():
+    """Return the process-wide EventFormatter, so warm invocations reuse the compiled template."""
+    global _formatter
+    with _formatter_lock:
+        if _formatter is None:
+            _formatter = EventFormatter()
+        return _formatter
+
+
 class EventDispatcher:
     def __init__(self, event):
         self.event = event
-        self.formatter = EventFormatter()
+        self.formatter = get_event_formatter()
 
     def _send_to_fresh(self, fields_or_event):
         secret_name = os.environ.get('FRESH_WEBHOOK_SECRET')
         if not secret_name:
             raise ValueError("Secret name not found in environment variables")
 
-        secret = aws_helpers.get_secret_value(secret_name)
+        secret = aws_helpers.get_cached_secret_value(secret_name)
         print("Sending event to Fresh Webhook")
 
         # Template expects raw EventBridge event structure
@@ -63,7 +107,15 @@ class EventDispatcher:
             'Authorization': secret['auth_key'],
             'Content-Type': 'text/html'
         }
-        response = fresh_helpers.send_event(formatted_html, secret, headers)
+        # The retry after an auth failure shares the delivery budget of the first attempt
+        deadline = fresh_helpers.get_delivery_deadline()
+        try:
+            response = fresh_helpers.send_event(formatted_html, secret, headers, deadline=deadline)
+        except fresh_helpers.FreshAuthError as e:
+            # The secret may have been rotated since it was cached: refresh it once and retry
+            print(f"{e}, refreshing the secret and retrying")
+            secret = aws_helpers.get_cached_secret_value(secret_name, rejected=secret)
+            response = fresh_helpers.send_event(formatted_html, secret, headers, deadline=deadline)
         return response
 
     def handle_cloudwatch_alarm(self):
@@ -72,7 +124,7 @@ class EventDispatcher:
         alarm_arn = self.event.get("resources", [None])[0]
         if not alarm_arn:
             raise ValueError("CloudWatch alarm ARN not found in event resources")
-        tags = aws_helpers.get_cloudwatch_alarm_tags(alarm_arn)
+        tags = aws_helpers.get_cached_cloudwatch_alarm_tags(alarm_arn)
         fields = CloudwatchFields(self.event, tags).to_dict()
         self._send_to_fresh(fields)
         return fields
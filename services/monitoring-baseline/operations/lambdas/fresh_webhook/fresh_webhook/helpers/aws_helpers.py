@@ -1,11 +1,46 @@
-import boto3
+import os
 import json 
+import time
+import random
+import threading
+from collections import OrderedDict
+import boto3
 
 session = boto3.session.Session()
 
+# Creating clients from a shared session is not thread-safe, so batched dispatch serializes it
+_client_lock = threading.Lock()
+
+# Secrets are cached in-process for this long; each entry expires up to SECRET_CACHE_JITTER earlier
+# so containers started together do not all refresh at once
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get('SECRET_CACHE_TTL_SECONDS', '300'))
+SECRET_CACHE_JITTER = 0.2
+
+_secret_cache = {}
+_secret_lock = threading.Lock()
+
+# Alarm tags are cached per alarm ARN in a bounded LRU. Alarms without a severity tag are cached
+# for a shorter time so a newly added tag is picked up soon
+ALARM_TAG_CACHE_SIZE = int(os.environ.get('ALARM_TAG_CACHE_SIZE', '512'))
+ALARM_TAG_CACHE_TTL_SECONDS = int(os.environ.get('ALARM_TAG_CACHE_TTL_SECONDS', '900'))
+ALARM_TAG_NEGATIVE_TTL_SECONDS = int(os.environ.get('ALARM_TAG_NEGATIVE_TTL_SECONDS', '120'))
+
+# Warm the alarm tag cache for every alarm in the region with one sweep on the first cache miss
+ALARM_TAG_PREFETCH = os.environ.get('ALARM_TAG_PREFETCH', 'false').lower() == 'true'
+
+_alarm_tag_cache = OrderedDict()
+_alarm_tag_lock = threading.Lock()
+_alarm_tags_prefetched_at = None
+_MISSING = object()
+
+def _get_client(service_name):
+    with _client_lock:
+        return session.client(service_name=service_name)
+
+
 def get_secret_value(secret_name):
     """Retrieve secret from AWS Secrets Manager, raising an exception on failure."""    
-    client = session.client(service_name='secretsmanager')
+    client = _get_client('secretsmanager')
     response = client.get_secret_value(SecretId=secret_name)
 
     secret_string = response.get('SecretString')
@@ -13,10 +48,110 @@ def get_secret_value(secret_name):
         return json.loads(secret_string)
     else:
         raise Exception("Secret string is empty or not found in the response.")
+
+
+def get_cached_secret_value(secret_name, rejected=None):
+    """Return a secret from the in-process cache, fetching it when missing or expired.
+
+    Pass the value a service rejected as `rejected` to force a refresh, e.g. after a rotation.
+    The refresh only happens once: callers holding the same stale value get the new one.
+    """
+    with _secret_lock:
+        entry = _secret_cache.get(secret_name)
+        if entry and time.monotonic() < entry[1] and (rejected is None or entry[0] is not rejected):
+            return entry[0]
+
+        value = get_secret_value(secret_name)
+        ttl = SECRET_CACHE_TTL_SECONDS * random.uniform(1 - SECRET_CACHE_JITTER, 1)
+        _secret_cache[secret_name] = (value, time.monotonic() + ttl)
+        return value
+
+
+def clear_secret_cache():
+    with _secret_lock:
+        _secret_cache.clear()
     
 
 # using the list-tags-for-resource API
 def get_cloudwatch_alarm_tags(alarm_name):
-    client = session.client(service_name='cloudwatch')
+    client = _get_client('cloudwatch')
     response = client.list_tags_for_resource(ResourceARN=alarm_name)
     return response["Tags"]
+
+
+def _lookup_alarm_tags(alarm_arn):
+    with _alarm_tag_lock:
+        entry = _alarm_tag_cache.get(alarm_arn)
+        if entry is None or time.monotonic() >= entry[1]:
+            return _MISSING
+        _alarm_tag_cache.move_to_end(alarm_arn)
+        return entry[0]
+
+
+def _store_alarm_tags(alarm_arn, tags):
+    has_severity = any(tag.get('Key') == 'severity' for tag in tags)
+    ttl = ALARM_TAG_CACHE_TTL_SECONDS if has_severity else ALARM_TAG_NEGATIVE_TTL_SECONDS
+    with _alarm_tag_lock:
+        _alarm_tag_cache[alarm_arn] = (tags, time.monotonic() + ttl)
+        _alarm_tag_cache.move_to_end(alarm_arn)
+        while len(_alarm_tag_cache) > ALARM_TAG_CACHE_SIZE:
+            _alarm_tag_cache.popitem(last=False)
+
+
+def prefetch_cloudwatch_alarm_tags():
+    """Warm the alarm tag cache for all alarms in the region.
+
+    One paginated DescribeAlarms sweep finds the alarms and one paginated GetResources sweep
+    returns the tags of all tagged alarms; alarms without tags are cached as such.
+    """
+    global _alarm_tags_prefetched_at
+    # Claimed up front so a failing sweep is not retried on every cache miss
+    _alarm_tags_prefetched_at = time.monotonic()
+    alarm_arns = []
+    paginator = _get_client('cloudwatch').get_paginator('describe_alarms')
+    for page in paginator.paginate(AlarmTypes=['MetricAlarm', 'CompositeAlarm']):
+        alarm_arns.extend(alarm['AlarmArn'] for alarm in page.get('MetricAlarms', []) + page.get('CompositeAlarms', []))
+
+    tags_by_arn = {}
+    paginator = _get_client('resourcegroupstaggingapi').get_paginator('get_resources')
+    for page in paginator.paginate(ResourceTypeFilters=['cloudwatch:alarm']):
+        for resource in page.get('ResourceTagMappingList', []):
+            tags_by_arn[resource['ResourceARN']] = resource.get('Tags', [])
+
+    for alarm_arn in alarm_arns:
+        _store_alarm_tags(alarm_arn, tags_by_arn.get(alarm_arn, []))
+    print(f"Prefetched tags of {len(alarm_arns)} alarms")
+
+
+def _prefetch_due():
+    return ALARM_TAG_PREFETCH and (
+        _alarm_tags_prefetched_at is None
+        or time.monotonic() - _alarm_tags_prefetched_at >= ALARM_TAG_CACHE_TTL_SECONDS
+    )
+
+
+def get_cached_cloudwatch_alarm_tags(alarm_arn):
+    """Return the tags of an alarm from the LRU cache, looking them up on a miss."""
+    tags = _lookup_alarm_tags(alarm_arn)
+    if tags is not _MISSING:
+        return tags
+
+    if _prefetch_due():
+        try:
+            prefetch_cloudwatch_alarm_tags()
+        except Exception as e:
+            print(f"[WARN] Alarm tag prefetch failed, looking up tags of {alarm_arn}: {e}")
+        tags = _lookup_alarm_tags(alarm_arn)
+        if tags is not _MISSING:
+            return tags
+
+    tags = get_cloudwatch_alarm_tags(alarm_arn)
+    _store_alarm_tags(alarm_arn, tags)
+    return tags
+
+
+def clear_alarm_tag_cache():
+    global _alarm_tags_prefetched_at
+    with _alarm_tag_lock:
+        _alarm_tag_cache.clear()
+        _alarm_tags_prefetched_at = None
@@ -1,7 +1,130 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
 import requests
+from requests.adapters import HTTPAdapter
 
-def send_event(event, secret, headers=None):
-    """Send event to Fresh Webhook endpoint."""
+# Connect and read timeouts per attempt, so a hung endpoint fails fast instead of using up the Lambda timeout
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get('FRESH_CONNECT_TIMEOUT_SECONDS', '3'))
+READ_TIMEOUT_SECONDS = float(os.environ.get('FRESH_READ_TIMEOUT_SECONDS', '8'))
+
+# Retries of 429/5xx responses with full-jitter backoff (or the Retry-After the server asks for),
+# all within a total delivery budget that stays below the Lambda timeout. A retry only starts when
+# its backoff and a worst-case attempt still fit in the budget
+MAX_RETRIES = int(os.environ.get('FRESH_MAX_RETRIES', '3'))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+DELIVERY_BUDGET_SECONDS = float(os.environ.get('FRESH_DELIVERY_BUDGET_SECONDS', '20'))
+
+# Keep-alive connections kept per host, enough for concurrent deliveries
+POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+_latency_hooks = []
+
+
+class FreshAuthError(Exception):
+    """Freshservice rejected the webhook credentials (HTTP 401 or 403)."""
+
+
+def get_session():
+    """Return the process-wide session, so warm invocations reuse open keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0))
+        return _session
+
+
+def add_latency_hook(hook):
+    """Register a callable receiving (attempt, status_code, elapsed_seconds) after every delivery attempt.
+
+    status_code is None when the attempt failed without a response.
+    """
+    _latency_hooks.append(hook)
+
+
+def _report_latency(attempt, status_code, elapsed):
+    for hook in _latency_hooks:
+        try:
+            hook(attempt, status_code, elapsed)
+        except Exception as e:
+            print(f"[WARN] Latency hook failed: {e}")
+
+
+def get_delivery_deadline():
+    """Monotonic time by which a delivery, including its retries, has to be finished."""
+    return time.monotonic() + DELIVERY_BUDGET_SECONDS
+
+
+def get_attempt_timeouts(deadline):
+    """Connect and read timeouts of the next attempt, shrunk to what remains of the delivery budget."""
+    remaining = deadline - time.monotonic()
+    if remaining >= CONNECT_TIMEOUT_SECONDS + READ_TIMEOUT_SECONDS:
+        return CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS
+    if remaining <= 0:
+        raise requests.exceptions.Timeout("Freshservice delivery budget exhausted")
+    connect = min(CONNECT_TIMEOUT_SECONDS, remaining / 2)
+    return connect, remaining - connect
+
+
+def get_retry_delay(response, attempt):
+    """Seconds to wait before the next attempt: the server's Retry-After if given, else jittered backoff."""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def post_with_retries(endpoint, headers, data, deadline=None):
+    """POST to Freshservice on the pooled session, retrying 429/5xx responses and connection errors.
+
+    Read timeouts are not retried: the ticket may already have been created. Returns the last
+    response once retries or the delivery budget, which ends at the given deadline, run out.
+    """
+    session = get_session()
+    if deadline is None:
+        deadline = get_delivery_deadline()
+    for attempt in range(MAX_RETRIES + 1):
+        attempt_started = time.monotonic()
+        try:
+            response = session.post(endpoint, headers=headers, data=data, timeout=get_attempt_timeouts(deadline))
+        except requests.exceptions.RequestException as e:
+            _report_latency(attempt, None, time.monotonic() - attempt_started)
+            # Connect timeouts are connection errors; read timeouts are not and are raised right away
+            if not isinstance(e, requests.exceptions.ConnectionError):
+                raise
+            response, error = None, e
+        else:
+            _report_latency(attempt, response.status_code, time.monotonic() - attempt_started)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            error = None
+
+        delay = get_retry_delay(response, attempt)
+        worst_case_attempt = CONNECT_TIMEOUT_SECONDS + READ_TIMEOUT_SECONDS
+        if attempt == MAX_RETRIES or time.monotonic() + delay + worst_case_attempt > deadline:
+            if error is not None:
+                raise error
+            return response
+        print(f"Freshservice delivery attempt {attempt + 1} failed " +
+              f"({response.status_code if response is not None else error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def send_event(event, secret, headers=None, deadline=None):
+    """Send event to Fresh Webhook endpoint, within the delivery budget ending at deadline if given."""
     if headers is None:
         headers = {
             'Authorization': secret['auth_key'],
@@ -10,9 +133,11 @@ def send_event(event, secret, headers=None):
     else:
         # Ensure Authorization header is set
         headers['Authorization'] = secret['auth_key']
-    
+
     endpoint = secret['endpoint']
-    response = requests.post(endpoint, headers=headers, data=event)
+    response = post_with_retries(endpoint, headers, event, deadline)
     print(response.text)
+    if response.status_code in (401, 403):
+        raise FreshAuthError(f"Freshservice rejected the credentials with HTTP {response.status_code}")
+    response.raise_for_status()
     return response.text
-    
\ No newline at end of file
@@ -1,10 +1,63 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from fresh_webhook.event_dispatcher import EventDispatcher
+from fresh_webhook.helpers import fresh_helpers
+
+# Events of an SQS batch dispatched and delivered to Freshservice at the same time; at least the
+# batch size of the event source mapping, so a whole batch is delivered in one wave
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '10'))
+
+# An event is only started while a full delivery budget (plus formatting time) fits before the timeout
+MIN_REMAINING_TIME_MS = int((fresh_helpers.DELIVERY_BUDGET_SECONDS + 5) * 1000)
+
+def parse_record(record):
+    """Return the EventBridge event carried by an SQS record, unwrapping SNS notifications."""
+    body = json.loads(record['body'])
+    if body.get('Type') == 'Notification' and 'Message' in body:
+        body = json.loads(body['Message'])
+    return body
+
+def process_record(record):
+    return EventDispatcher(parse_record(record)).dispatch()
+
+def batch_handler(event, context=None):
+    """Dispatch a batch of SQS records concurrently; failed messages are reported in 'batchItemFailures'.
+
+    Records that cannot start while a full delivery still fits before the function times out are
+    reported as failed too, so they are retried instead of the whole batch timing out.
+    """
+    records = event['Records']
+    failures = []
+
+    def process_in_time(record):
+        if context is not None and context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS:
+            raise TimeoutError("Not enough time left to deliver the event")
+        return process_record(record)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(records)))) as executor:
+        futures = [(record, executor.submit(process_in_time, record)) for record in records]
+        for record, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] Failed to process message {record.get('messageId')}: {e}")
+                failures.append({'itemIdentifier': record.get('messageId')})
+
+    print(f"Processed batch of {len(records)} events, {len(failures)} failed")
+    return {
+        'statusCode': 200,
+        'body': "Success" if not failures else f"{len(failures)} of {len(records)} events failed",
+        'batchItemFailures': failures
+    }
+
+def handler(event, context):
+    # Events queued in SQS arrive in batches
+    if 'Records' in event:
+        return batch_handler(event, context)
 
-def handler(event, _):
     print("Orig Event:")
     print(json.dumps(event))
     result = EventDispatcher(event).dispatch()
@@ -1,6 +1,7 @@
 import pytest
 import os
 from unittest.mock import patch, MagicMock
+from fresh_webhook.helpers import aws_helpers
 
 
 @pytest.fixture(autouse=True)
@@ -8,6 +9,8 @@ def mock_aws_and_fresh_services():
     """Mock AWS and Freshservice calls for all tests."""
     # Set required environment variable
     os.environ['FRESH_WEBHOOK_SECRET'] = 'test-secret'
+    aws_helpers.clear_secret_cache()
+    aws_helpers.clear_alarm_tag_cache()
 
     # Mock AWS Secrets Manager
     with patch('fresh_webhook.helpers.aws_helpers.get_secret_value') as mock_secret:
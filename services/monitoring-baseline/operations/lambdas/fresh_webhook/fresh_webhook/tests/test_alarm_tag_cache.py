@@ -0,0 +1,57 @@
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+from fresh_webhook.tests.helpers import load_event
+from fresh_webhook.index import handler
+from fresh_webhook.helpers import aws_helpers
+
+ALARM_ARN = 'arn:aws:cloudwatch:eu-west-1:907174171861:alarm:failing_lambda_alarm'
+
+def load_alarm_event():
+    return load_event(os.path.join(os.path.dirname(__file__), 'events', 'cloudwatch_alarm.json'))
+
+def test_flapping_alarm_tags_are_looked_up_once(mock_aws_and_fresh_services):
+    for _ in range(3):
+        handler(load_alarm_event(), None)
+    assert mock_aws_and_fresh_services['tags'].call_count == 1
+
+def test_missing_severity_is_cached_for_a_shorter_time(mock_aws_and_fresh_services):
+    mock_tags = mock_aws_and_fresh_services['tags']
+    mock_tags.return_value = [{'Key': 'Environment', 'Value': 'test'}]
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="No 'severity' key"):
+            handler(load_alarm_event(), None)
+    assert mock_tags.call_count == 1
+
+    later = aws_helpers.time.monotonic() + aws_helpers.ALARM_TAG_NEGATIVE_TTL_SECONDS + 1
+    with patch('fresh_webhook.helpers.aws_helpers.time.monotonic', return_value=later):
+        with pytest.raises(Exception, match="No 'severity' key"):
+            handler(load_alarm_event(), None)
+    assert mock_tags.call_count == 2
+
+def test_least_recently_used_alarms_are_evicted(mock_aws_and_fresh_services):
+    with patch('fresh_webhook.helpers.aws_helpers.ALARM_TAG_CACHE_SIZE', 2):
+        for name in ('a', 'b', 'a', 'c', 'a'):
+            aws_helpers.get_cached_cloudwatch_alarm_tags(f'arn:alarm:{name}')
+    assert [call.args[0] for call in mock_aws_and_fresh_services['tags'].call_args_list] == [
+        'arn:alarm:a', 'arn:alarm:b', 'arn:alarm:c'
+    ]
+
+def test_prefetch_warms_tags_for_all_alarms(mock_aws_and_fresh_services):
+    clients = {'cloudwatch': MagicMock(), 'resourcegroupstaggingapi': MagicMock()}
+    clients['cloudwatch'].get_paginator.return_value.paginate.return_value = [
+        {'MetricAlarms': [{'AlarmArn': ALARM_ARN}, {'AlarmArn': 'arn:alarm:untagged'}], 'CompositeAlarms': []}
+    ]
+    clients['resourcegroupstaggingapi'].get_paginator.return_value.paginate.return_value = [
+        {'ResourceTagMappingList': [{'ResourceARN': ALARM_ARN, 'Tags': [{'Key': 'severity', 'Value': 'error'}]}]}
+    ]
+    session = MagicMock()
+    session.client.side_effect = lambda service_name: clients[service_name]
+
+    with patch('fresh_webhook.helpers.aws_helpers.session', session), \
+            patch('fresh_webhook.helpers.aws_helpers.ALARM_TAG_PREFETCH', True):
+        handler(load_alarm_event(), None)
+        assert aws_helpers.get_cached_cloudwatch_alarm_tags('arn:alarm:untagged') == []
+
+    mock_aws_and_fresh_services['tags'].assert_not_called()
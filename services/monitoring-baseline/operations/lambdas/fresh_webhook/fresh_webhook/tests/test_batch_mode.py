@@ -0,0 +1,52 @@
+import os
+import json
+from unittest.mock import MagicMock, patch
+from fresh_webhook.tests.helpers import load_event
+from fresh_webhook.index import handler
+
+def load_named_event(name):
+    return load_event(os.path.join(os.path.dirname(__file__), 'events', name))
+
+def make_sqs_record(message_id, event):
+    return {'messageId': message_id, 'body': json.dumps(event)}
+
+def test_batch_reports_failed_messages(mock_aws_and_fresh_services):
+    event = {'Records': [
+        make_sqs_record('health', load_named_event('aws_health_event.json')),
+        make_sqs_record('unknown', load_named_event('unknown_event_type.json')),
+        make_sqs_record('guardduty', load_named_event('guardduty_event.json')),
+        {'messageId': 'malformed', 'body': 'not json'}
+    ]}
+
+    response = handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert sorted(failure['itemIdentifier'] for failure in response['batchItemFailures']) == ['malformed', 'unknown']
+    assert mock_aws_and_fresh_services['secret'].call_count == 1
+
+def test_batch_delivers_every_event(mock_aws_and_fresh_services):
+    records = [make_sqs_record(f'message-{number}', load_named_event('aws_health_event.json')) for number in range(20)]
+
+    response = handler({'Records': records}, None)
+
+    assert response['batchItemFailures'] == []
+    assert mock_aws_and_fresh_services['send_event'].call_count == 20
+
+def test_batch_unwraps_sns_notifications(mock_aws_and_fresh_services):
+    notification = {'Type': 'Notification', 'Message': json.dumps(load_named_event('aws_health_event.json'))}
+
+    response = handler({'Records': [make_sqs_record('sns', notification)]}, None)
+
+    assert response['batchItemFailures'] == []
+    assert mock_aws_and_fresh_services['send_event'].call_count == 1
+
+def test_batch_leaves_events_without_time_to_a_retry(mock_aws_and_fresh_services):
+    records = [make_sqs_record(f'message-{number}', load_named_event('aws_health_event.json')) for number in range(4)]
+    context = MagicMock()
+    context.get_remaining_time_in_millis.side_effect = [60000, 60000, 1000, 1000]
+
+    with patch('fresh_webhook.index.BATCH_CONCURRENCY', 1):
+        response = handler({'Records': records}, context)
+
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == ['message-2', 'message-3']
+    assert mock_aws_and_fresh_services['send_event'].call_count == 2
@@ -0,0 +1,28 @@
+import os
+from jinja2 import FileSystemLoader, ModuleLoader
+from fresh_webhook.tests.helpers import load_event
+from fresh_webhook.event_dispatcher import (
+    TEMPLATES_DIR, EventDispatcher, EventFormatter, compiled_templates_available, get_event_formatter
+)
+from fresh_webhook.compile_templates import compile_templates
+
+def test_formatter_is_shared_between_dispatchers():
+    event = load_event(os.path.join(os.path.dirname(__file__), 'events', 'aws_health_event.json'))
+    assert EventDispatcher(event).formatter is EventDispatcher(event).formatter
+    assert get_event_formatter().get_template('event.html.j2') is get_event_formatter().template
+
+def test_precompiled_templates_render_like_sources(tmp_path):
+    event = load_event(os.path.join(os.path.dirname(__file__), 'events', 'aws_health_event.json'))
+    compiled_dir = str(tmp_path / 'templates_compiled')
+    compile_templates(compiled_dir)
+
+    assert compiled_templates_available(compiled_dir)
+    compiled = EventFormatter(ModuleLoader(compiled_dir))
+    source = EventFormatter(FileSystemLoader(TEMPLATES_DIR))
+    # Pin the generation timestamp so both renders are comparable
+    for formatter in (compiled, source):
+        formatter.env.globals['now'] = lambda: '2024-01-01 00:00:00'
+    assert compiled.format_event(event) == source.format_event(event)
+
+def test_precompiled_templates_need_matching_version(tmp_path):
+    assert not compiled_templates_available(str(tmp_path))
@@ -0,0 +1,85 @@
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+from fresh_webhook.helpers import fresh_helpers
+# Imported before the autouse fixture patches it
+from fresh_webhook.helpers.fresh_helpers import send_event
+
+SECRET = {'auth_key': 'test-auth-key', 'endpoint': 'https://test.freshservice.com/webhook'}
+
+def make_response(status_code, headers=None):
+    response = MagicMock(status_code=status_code, headers=headers or {}, text=f'HTTP {status_code}')
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(f'HTTP {status_code}')
+    return response
+
+@pytest.fixture
+def mock_session():
+    session = MagicMock()
+    with patch('fresh_webhook.helpers.fresh_helpers.get_session', return_value=session), \
+            patch('fresh_webhook.helpers.fresh_helpers.time.sleep') as sleep:
+        session.sleep = sleep
+        yield session
+
+def test_session_is_pooled():
+    assert fresh_helpers.get_session() is fresh_helpers.get_session()
+
+def test_delivery_uses_timeouts(mock_session):
+    mock_session.post.return_value = make_response(200)
+
+    assert send_event('<p>alert</p>', SECRET, {'Content-Type': 'text/html'}) == 'HTTP 200'
+    assert mock_session.post.call_args.kwargs['timeout'] == (
+        fresh_helpers.CONNECT_TIMEOUT_SECONDS, fresh_helpers.READ_TIMEOUT_SECONDS
+    )
+
+def test_throttled_delivery_honours_retry_after(mock_session):
+    mock_session.post.side_effect = [make_response(429, {'Retry-After': '2'}), make_response(503), make_response(201)]
+
+    assert send_event('<p>alert</p>', SECRET) == 'HTTP 201'
+    assert mock_session.post.call_count == 3
+    assert mock_session.sleep.call_args_list[0].args[0] == 2.0
+    assert mock_session.sleep.call_args_list[1].args[0] <= fresh_helpers.BACKOFF_BASE_SECONDS * 2
+
+def test_delivery_fails_after_retries(mock_session):
+    mock_session.post.return_value = make_response(502)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        send_event('<p>alert</p>', SECRET)
+    assert mock_session.post.call_count == fresh_helpers.MAX_RETRIES + 1
+
+def test_read_timeout_is_not_retried(mock_session):
+    mock_session.post.side_effect = requests.exceptions.ReadTimeout()
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        send_event('<p>alert</p>', SECRET)
+    assert mock_session.post.call_count == 1
+
+def test_latency_hook_sees_every_attempt(mock_session):
+    attempts = []
+    mock_session.post.side_effect = [requests.exceptions.ConnectTimeout(), make_response(200)]
+
+    with patch('fresh_webhook.helpers.fresh_helpers._latency_hooks', []):
+        fresh_helpers.add_latency_hook(lambda attempt, status, elapsed: attempts.append((attempt, status)))
+        send_event('<p>alert</p>', SECRET)
+
+    assert attempts == [(0, None), (1, 200)]
+
+def test_retry_only_starts_when_a_full_attempt_fits_the_budget(mock_session):
+    mock_session.post.return_value = make_response(503)
+
+    with patch('fresh_webhook.helpers.fresh_helpers.get_retry_delay', return_value=1.0), \
+            patch('fresh_webhook.helpers.fresh_helpers.DELIVERY_BUDGET_SECONDS', 11.5):
+        with pytest.raises(requests.exceptions.HTTPError):
+            send_event('<p>alert</p>', SECRET)
+    assert mock_session.post.call_count == 1
+
+def test_attempt_timeouts_shrink_to_the_remaining_budget(mock_session):
+    mock_session.post.return_value = make_response(200)
+    deadline = fresh_helpers.time.monotonic() + 4
+
+    send_event('<p>alert</p>', SECRET, deadline=deadline)
+    connect, read = mock_session.post.call_args.kwargs['timeout']
+    assert connect <= 2 and connect + read <= 4
+
+    with pytest.raises(requests.exceptions.Timeout):
+        send_event('<p>alert</p>', SECRET, deadline=fresh_helpers.time.monotonic() - 1)
@@ -0,0 +1,38 @@
+import os
+from unittest.mock import patch
+from fresh_webhook.tests.helpers import load_event
+from fresh_webhook.index import handler
+from fresh_webhook.helpers import aws_helpers, fresh_helpers
+
+def load_health_event():
+    return load_event(os.path.join(os.path.dirname(__file__), 'events', 'aws_health_event.json'))
+
+def test_secret_is_fetched_once_for_many_events(mock_aws_and_fresh_services):
+    for _ in range(5):
+        handler(load_health_event(), None)
+    assert mock_aws_and_fresh_services['secret'].call_count == 1
+    assert mock_aws_and_fresh_services['send_event'].call_count == 5
+
+def test_expired_secret_is_fetched_again(mock_aws_and_fresh_services):
+    handler(load_health_event(), None)
+    with patch('fresh_webhook.helpers.aws_helpers.time.monotonic', return_value=10 ** 9):
+        handler(load_health_event(), None)
+    assert mock_aws_and_fresh_services['secret'].call_count == 2
+
+def test_auth_failure_refreshes_secret_and_retries(mock_aws_and_fresh_services):
+    mock_secret = mock_aws_and_fresh_services['secret']
+    mock_secret.side_effect = [
+        {'auth_key': 'rotated-away', 'endpoint': 'https://test.freshservice.com/webhook'},
+        {'auth_key': 'current', 'endpoint': 'https://test.freshservice.com/webhook'}
+    ]
+    mock_send = mock_aws_and_fresh_services['send_event']
+    mock_send.side_effect = [fresh_helpers.FreshAuthError('HTTP 401'), 'Ticket created successfully']
+
+    response = handler(load_health_event(), None)
+
+    assert response['statusCode'] == 200
+    assert mock_secret.call_count == 2
+    assert mock_send.call_args_list[1].args[1]['auth_key'] == 'current'
+    # The retry shares the delivery budget of the first attempt
+    assert mock_send.call_args_list[0].kwargs['deadline'] == mock_send.call_args_list[1].kwargs['deadline']
+    assert aws_helpers.get_cached_secret_value('test-secret')['auth_key'] == 'current'
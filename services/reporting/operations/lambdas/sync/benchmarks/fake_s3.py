@@ -0,0 +1,177 @@
+import io
+import time
+import itertools
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+
+class FakeS3:
+    """
+    In-memory stand-in for the S3 client calls made by the sync engine, with a fixed latency
+    added to every call. Objects only carry metadata (size, ETag, tags); state objects keep their
+    body. Every call is counted by operation name so API calls per object can be reported.
+    """
+
+    def __init__(self, region='eu-west-1', latency_ms=0):
+        self.region = region
+        self.latency = latency_ms / 1000
+        self.buckets = {}
+        self.sorted_keys = {}
+        self.uploads = {}
+        self.upload_ids = itertools.count(1)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(region_name=region, events=SimpleNamespace(register=lambda *args, **kwargs: None))
+
+    def _call(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _bucket(self, bucket):
+        return self.buckets.setdefault(bucket, {})
+
+    def _put(self, bucket, key, obj):
+        with self.lock:
+            objects = self._bucket(bucket)
+            if key not in objects:
+                self.sorted_keys.pop(bucket, None)
+            objects[key] = obj
+
+    def _get(self, bucket, key, operation):
+        obj = self._bucket(bucket).get(key)
+        if obj is None:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}, 'ResponseMetadata': {'HTTPStatusCode': 404}}, operation)
+        return obj
+
+    def _keys(self, bucket):
+        with self.lock:
+            keys = self.sorted_keys.get(bucket)
+            if keys is None:
+                keys = self.sorted_keys[bucket] = sorted(self._bucket(bucket))
+            return keys
+
+    def add_object(self, bucket, key, size, etag):
+        """
+        Seed an object without counting an API call.
+        """
+        self._put(bucket, key, {'Size': size, 'ETag': f'"{etag}"', 'Tags': None})
+
+    def head_bucket(self, Bucket):
+        self._call('HeadBucket')
+        return {'ResponseMetadata': {'HTTPHeaders': {'x-amz-bucket-region': self.region}}}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, Delimiter=None,
+                        StartAfter=None):
+        self._call('ListObjectsV2')
+        keys = self._keys(Bucket)
+        objects = self._bucket(Bucket)
+        start = bisect_left(keys, Prefix)
+        if ContinuationToken or StartAfter:
+            start = max(start, bisect_right(keys, ContinuationToken or StartAfter))
+        contents, common_prefixes = [], []
+        position = start
+        while position < len(keys) and len(contents) + len(common_prefixes) < MaxKeys:
+            key = keys[position]
+            if not key.startswith(Prefix):
+                break
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter)[0] + Delimiter
+                common_prefixes.append({'Prefix': common})
+                # Skip every key under the common prefix
+                position = bisect_left(keys, common[:-1] + chr(ord(Delimiter) + 1))
+                last_key = keys[position - 1]
+                continue
+            obj = objects.get(key)
+            if obj is not None:
+                contents.append({'Key': key, 'ETag': obj['ETag'], 'Size': obj['Size']})
+            last_key = key
+            position += 1
+        page = {'KeyCount': len(contents)}
+        if contents:
+            page['Contents'] = contents
+        if common_prefixes:
+            page['CommonPrefixes'] = common_prefixes
+        if position < len(keys) and keys[position].startswith(Prefix):
+            page['IsTruncated'] = True
+            page['NextContinuationToken'] = last_key
+        return page
+
+    def head_object(self, Bucket, Key, **_):
+        self._call('HeadObject')
+        obj = self._get(Bucket, Key, 'HeadObject')
+        return {'ContentLength': obj['Size'], 'ETag': obj['ETag']}
+
+    def get_object(self, Bucket, Key):
+        self._call('GetObject')
+        obj = self._get(Bucket, Key, 'GetObject')
+        return {'Body': io.BytesIO(obj.get('Body', b'')), 'ContentLength': obj['Size']}
+
+    def put_object(self, Bucket, Key, Body=b'', **_):
+        self._call('PutObject')
+        self._put(Bucket, Key, {'Size': len(Body), 'ETag': '"state"', 'Body': Body, 'Tags': None})
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self._call('DeleteObject')
+        with self.lock:
+            if self._bucket(Bucket).pop(Key, None) is not None:
+                self.sorted_keys.pop(Bucket, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self._call('DeleteObjects')
+        with self.lock:
+            for obj in Delete['Objects']:
+                self._bucket(Bucket).pop(obj['Key'], None)
+            self.sorted_keys.pop(Bucket, None)
+        return {'Deleted': [{'Key': obj['Key']} for obj in Delete['Objects']], 'Errors': []}
+
+    def copy_object(self, Bucket, Key, CopySource, Tagging=None, **_):
+        self._call('CopyObject')
+        source = self._get(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+        self._put(Bucket, Key, {**source, 'Tags': Tagging})
+        return {'CopyObjectResult': {'ETag': source['ETag']}}
+
+    def create_multipart_upload(self, Bucket, Key, Tagging=None, **_):
+        self._call('CreateMultipartUpload')
+        with self.lock:
+            upload_id = str(next(self.upload_ids))
+            self.uploads[upload_id] = {'Size': 0, 'Tags': Tagging}
+        return {'UploadId': upload_id}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange, **_):
+        self._call('UploadPartCopy')
+        start, end = CopySourceRange[len('bytes='):].split('-')
+        with self.lock:
+            self.uploads[UploadId]['Size'] += int(end) - int(start) + 1
+        return {'CopyPartResult': {'ETag': f'"part{PartNumber}"'}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._call('CompleteMultipartUpload')
+        with self.lock:
+            upload = self.uploads.pop(UploadId)
+        etag = f'"multipart-{len(MultipartUpload["Parts"])}"'
+        self._put(Bucket, Key, {'Size': upload['Size'], 'ETag': etag, 'Tags': upload['Tags']})
+        return {'ETag': etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._call('AbortMultipartUpload')
+        with self.lock:
+            self.uploads.pop(UploadId, None)
+        return {}
+
+    def get_object_tagging(self, Bucket, Key):
+        self._call('GetObjectTagging')
+        tags = self._get(Bucket, Key, 'GetObjectTagging').get('Tags') or ''
+        return {'TagSet': [{'Key': name, 'Value': value} for name, _, value in
+                           (tag.partition('=') for tag in tags.split('&') if tag)]}
+
+    def get_object_attributes(self, Bucket, Key, ObjectAttributes):
+        self._call('GetObjectAttributes')
+        self._get(Bucket, Key, 'GetObjectAttributes')
+        return {}
@@ -0,0 +1,192 @@
+"""
+Benchmark full_sync and object_sync against the in-memory S3 stand-in.
+
+    python -m benchmarks.run                                 # 1k and 10k objects, compared to baseline.json
+    python -m benchmarks.run --sizes 1000 10000 100000       # include the 100k prefix
+    python -m benchmarks.run --latency-ms 5 --save-baseline  # record a new baseline
+
+Scenarios per prefix size: full_sync into an empty destination, a full_sync re-run merging the
+source and destination listings (nothing to copy) and object_sync over SQS batches of notifications. Each reports
+objects/s, API calls per object and peak traced memory; with --fail-on-regression the exit code is 1
+when objects/s drops or API calls per object grow beyond the tolerance compared to the baseline.
+"""
+import os
+
+os.environ.setdefault('SYNC_METRICS', 'false')
+os.environ.setdefault('DESTINATION_BUCKET', 'benchmark-destination')
+
+import sys
+import json
+import random
+import argparse
+import datetime
+import tracemalloc
+import time
+from unittest.mock import patch
+from sync.clients import reset_clients
+from sync.coalesce import reset_recent_copies
+from sync.full_sync import handler as full_sync_handler
+from sync.object_sync import handler as object_sync_handler
+from sync.s3_copy import MIB
+from .fake_s3 import FakeS3
+
+SOURCE_BUCKET = 'benchmark-source'
+DESTINATION_BUCKET = os.environ['DESTINATION_BUCKET']
+REGION = 'eu-west-1'
+PREFIX = 'benchmark/'
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_SIZES = [1000, 10000]
+SQS_BATCH_SIZE = 50
+
+# Object size mix as (share, smallest, largest); the largest class takes the multipart copy path
+SIZE_MIX = [
+    (0.70, 1024, MIB),
+    (0.25, MIB, 100 * MIB),
+    (0.04, 100 * MIB, 512 * MIB),
+    (0.01, 512 * MIB, 2048 * MIB)
+]
+
+def make_objects(count, seed=0):
+    """
+    Build a reproducible synthetic prefix of (key, size, etag) spread over 100 sub-prefixes.
+    """
+    rng = random.Random(seed)
+    objects = []
+    for number in range(count):
+        draw = rng.random()
+        for share, smallest, largest in SIZE_MIX:
+            if draw < share:
+                break
+            draw -= share
+        key = f'{PREFIX}{number % 100:02d}/object-{number:07d}.csv'
+        objects.append((key, rng.randint(smallest, largest), f'{number:032x}'))
+    return objects
+
+def make_source(objects, latency_ms):
+    s3 = FakeS3(REGION, latency_ms)
+    for key, size, etag in objects:
+        s3.add_object(SOURCE_BUCKET, key, size, etag)
+    return s3
+
+def make_sqs_records(objects):
+    event_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return [{
+        'messageId': f'message-{number}',
+        'body': json.dumps({
+            'Message': json.dumps({
+                'region': REGION,
+                'time': event_time,
+                'detail': {
+                    'bucket': {'name': SOURCE_BUCKET},
+                    'object': {'key': key, 'size': size, 'etag': etag}
+                }
+            })
+        })
+    } for number, (key, size, etag) in enumerate(objects)]
+
+def run_full_sync():
+    return [full_sync_handler({'action': 'full_sync', 'sourceBucket': SOURCE_BUCKET, 'region': REGION,
+                               'prefix': PREFIX}, None)]
+
+def run_object_sync(records):
+    return [object_sync_handler({'Records': records[start:start + SQS_BATCH_SIZE]}, None)
+            for start in range(0, len(records), SQS_BATCH_SIZE)]
+
+def measure(s3, count, run):
+    """
+    Run a scenario against the stand-in and collect throughput, API calls and peak memory.
+    """
+    reset_clients()
+    reset_recent_copies()
+    calls_before = s3.calls.copy()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with patch('sync.clients.boto3.client', return_value=s3):
+        responses = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    failed = [response for response in responses if response['statusCode'] != 200]
+    if failed:
+        raise RuntimeError(f"Scenario failed: {failed[0]['body']}")
+    calls = s3.calls - calls_before
+    return {
+        'objects': count,
+        'seconds': round(elapsed, 3),
+        'objectsPerSecond': round(count / elapsed, 1),
+        'apiCallsPerObject': round(sum(calls.values()) / count, 3),
+        'peakMemoryMb': round(peak / MIB, 1),
+        'apiCalls': dict(sorted(calls.items()))
+    }
+
+def run_benchmarks(sizes, latency_ms):
+    results = {}
+    for count in sizes:
+        objects = make_objects(count)
+
+        s3 = make_source(objects, latency_ms)
+        results[f'full_sync_initial/{count}'] = measure(s3, count, run_full_sync)
+        results[f'full_sync_rerun/{count}'] = measure(s3, count, run_full_sync)
+
+        s3 = make_source(objects, latency_ms)
+        records = make_sqs_records(objects)
+        results[f'object_sync/{count}'] = measure(s3, count, lambda: run_object_sync(records))
+    return results
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def compare(results, baseline, tolerance):
+    """
+    Print each scenario next to its baseline; returns the scenarios that regressed beyond the tolerance.
+    """
+    regressions = []
+    print(f"{'scenario':<28}{'obj/s':>10}{'calls/obj':>11}{'peak MB':>9}{'vs baseline':>13}")
+    for name, result in results.items():
+        previous = (baseline or {}).get('results', {}).get(name)
+        change = ''
+        if previous:
+            speed = result['objectsPerSecond'] / previous['objectsPerSecond'] - 1
+            change = f'{speed:+.0%}'
+            calls = result['apiCallsPerObject'] - previous['apiCallsPerObject']
+            if speed < -tolerance or calls > previous['apiCallsPerObject'] * tolerance:
+                regressions.append(name)
+                change += ' !'
+        print(f"{name:<28}{result['objectsPerSecond']:>10}{result['apiCallsPerObject']:>11}"
+              f"{result['peakMemoryMb']:>9}{change:>13}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the reporting sync engine against an in-memory S3')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='objects per synthetic prefix')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='latency added to every S3 call')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with 1 when a scenario regressed')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.latency_ms)
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get('latencyMs') != args.latency_ms:
+        print(f"Baseline was recorded with {baseline.get('latencyMs')} ms latency, comparison is not like for like")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'latencyMs': args.latency_ms, 'results': results}, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions and args.fail_on_regression:
+        print(f"Regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import logging
+from urllib.parse import urlencode
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Object tag holding the ETag of the source object a destination object was copied from
+SOURCE_ETAG_TAG = 'source-etag'
+
+def source_etag_tagging(source_etag):
+    """
+    Build the Tagging value that records the source ETag on a copied object. The copy gets only
+    this tag: tags of the source object are not carried over.
+    """
+    if not source_etag:
+        return None
+    return urlencode({SOURCE_ETAG_TAG: source_etag.strip('"')})
+
+def get_recorded_source_etag(s3_client, bucket, key):
+    try:
+        response = s3_client.get_object_tagging(Bucket=bucket, Key=key)
+    except ClientError as e:
+        logger.warning(f"Could not read tags of {bucket}/{key}: {str(e)}")
+        return None
+    for tag in response.get('TagSet', []):
+        if tag['Key'] == SOURCE_ETAG_TAG:
+            return tag['Value']
+    return None
+
+def get_checksums(s3_client, bucket, key):
+    """
+    Return the additional checksums (ChecksumSHA256, ChecksumCRC32C, ...) S3 stores for an object.
+    """
+    try:
+        response = s3_client.get_object_attributes(Bucket=bucket, Key=key, ObjectAttributes=['Checksum'])
+    except ClientError as e:
+        logger.warning(f"Could not read checksums of {bucket}/{key}: {str(e)}")
+        return {}
+    return {name: value for name, value in response.get('Checksum', {}).items() if name.startswith('Checksum')}
+
+def objects_match(source_client, dest_client, source_bucket, destination_bucket, source_object):
+    """
+    Decide whether a source and destination object of equal size hold the same bytes even though
+    their ETags differ, as happens for multipart uploads and their server-side copies.
+    Uses the source ETag recorded on the destination object, then S3 additional checksums.
+    """
+    key = source_object['Key']
+    source_etag = (source_object.get('ETag') or '').strip('"')
+    if source_etag and get_recorded_source_etag(dest_client, destination_bucket, key) == source_etag:
+        logger.info(f"Object {key} matches by recorded source ETag")
+        return True
+
+    source_checksums = get_checksums(source_client, source_bucket, key)
+    if source_checksums:
+        dest_checksums = get_checksums(dest_client, destination_bucket, key)
+        common = set(source_checksums) & set(dest_checksums)
+        if common and all(source_checksums[name] == dest_checksums[name] for name in common):
+            logger.info(f"Object {key} matches by {', '.join(sorted(common))}")
+            return True
+    return False
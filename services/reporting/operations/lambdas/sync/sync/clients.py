@@ -0,0 +1,84 @@
+import os
+import boto3
+import logging
+import threading
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from .metrics import record_api_call
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Connection pool size per regional client; should cover the copy and multipart concurrency
+MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '64'))
+
+# Retry configuration shared by all pooled clients; attempts are kept low so sustained throttling
+# reaches the sync engine's adaptive limiter instead of being absorbed by client retries
+RETRY_MODE = os.environ.get('S3_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', '3'))
+
+# Clients and bucket regions are cached at module level so warm invocations reuse them
+_clients = {}
+_bucket_regions = {}
+_lock = threading.Lock()
+
+def get_s3_client(region):
+    """
+    Return the pooled S3 client for a region, creating it on first use.
+    Clients are safe to share between threads once created.
+    """
+    with _lock:
+        client = _clients.get(region)
+        if client is None:
+            logger.info(f"Creating S3 client for region {region}")
+            client = boto3.client(
+                's3',
+                region_name=region,
+                config=Config(
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    retries={'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS}
+                )
+            )
+            client.meta.events.register('before-call.s3', record_api_call)
+            _clients[region] = client
+        return client
+
+def get_bucket_region(bucket, default_region):
+    """
+    Resolve and cache the region of a bucket from the x-amz-bucket-region header of HeadBucket.
+    Falls back to the default region when it cannot be determined.
+    """
+    region = _bucket_regions.get(bucket)
+    if region:
+        return region
+
+    s3_client = get_s3_client(default_region)
+    try:
+        response = s3_client.head_bucket(Bucket=bucket)
+    except ClientError as e:
+        # Redirects and access errors still carry the bucket region header
+        response = e.response
+    region = response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
+    if not isinstance(region, str) or not region:
+        logger.warning(f"Could not resolve region of bucket {bucket}, using {default_region}")
+        return default_region
+
+    _bucket_regions[bucket] = region
+    logger.info(f"Bucket {bucket} is in region {region}")
+    return region
+
+def get_bucket_client(bucket, default_region=None):
+    """
+    Return the pooled S3 client for the region a bucket lives in.
+    """
+    default_region = default_region or os.environ.get('AWS_REGION', 'us-east-1')
+    return get_s3_client(get_bucket_region(bucket, default_region))
+
+def reset_clients():
+    """
+    Drop all pooled clients and cached bucket regions.
+    """
+    with _lock:
+        _clients.clear()
+        _bucket_regions.clear()
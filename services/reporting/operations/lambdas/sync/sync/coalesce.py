@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+import threading
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Notifications for a key copied within this many seconds are treated as duplicates
+COALESCE_WINDOW_SECONDS = int(os.environ.get('SYNC_COALESCE_WINDOW_SECONDS', '300'))
+
+# Recently copied versions per (bucket, key), kept across warm invocations
+_recent_copies = {}
+_lock = threading.Lock()
+
+def get_sequence(target):
+    """
+    Return the S3 event sequencer in upper case, or None when the event carries none.
+    Sequencers are only comparable as strings after padding to the same length, see compare_sequences.
+    """
+    sequencer = target.get('sequencer')
+    return sequencer.upper() if sequencer else None
+
+def compare_sequences(first, second):
+    """
+    Compare two S3 sequencers the way AWS documents it: right-pad the shorter one with zeros and
+    compare the strings. Returns a negative number, zero or a positive number like cmp().
+    """
+    width = max(len(first), len(second))
+    first, second = first.ljust(width, '0'), second.ljust(width, '0')
+    return (first > second) - (first < second)
+
+def is_later(order, current):
+    """
+    Check whether a (sequencer, position) order is later than another; notifications without a
+    sequencer sort first and ties fall back to the position in the batch.
+    """
+    (sequence, position), (current_sequence, current_position) = order, current
+    if sequence is None or current_sequence is None:
+        if sequence is not None or current_sequence is not None:
+            return sequence is not None
+        return position > current_position
+    comparison = compare_sequences(sequence, current_sequence)
+    return comparison > 0 if comparison else position > current_position
+
+def coalesce_jobs(jobs):
+    """
+    Keep only the latest notification per bucket/key in a batch.
+    Returns the jobs to copy and the records superseded by a later notification.
+    """
+    latest = {}
+    superseded = []
+    for position, (record, target) in enumerate(jobs):
+        identity = (target['bucket'], target['key'])
+        order = (get_sequence(target), position)
+        current = latest.get(identity)
+        if current is None:
+            latest[identity] = (order, record, target)
+        elif is_later(order, current[0]):
+            superseded.append(current[1])
+            latest[identity] = (order, record, target)
+        else:
+            superseded.append(record)
+    return [(record, target) for _, record, target in latest.values()], superseded
+
+def is_recently_copied(target):
+    """
+    Check whether the same or a newer version of the key was copied within the coalescing window.
+    """
+    identity = (target['bucket'], target['key'])
+    with _lock:
+        entry = _recent_copies.get(identity)
+        if entry is None:
+            return False
+        etag, sequence, expires_at = entry
+        if expires_at < time.monotonic():
+            del _recent_copies[identity]
+            return False
+    if target.get('etag') and etag == target['etag'].strip('"'):
+        return True
+    new_sequence = get_sequence(target)
+    return new_sequence is not None and sequence is not None and compare_sequences(new_sequence, sequence) <= 0
+
+def remember_copy(target):
+    etag = target['etag'].strip('"') if target.get('etag') else None
+    with _lock:
+        _recent_copies[(target['bucket'], target['key'])] = (
+            etag, get_sequence(target), time.monotonic() + COALESCE_WINDOW_SECONDS
+        )
+
+def prune_recent_copies():
+    now = time.monotonic()
+    with _lock:
+        for identity in [identity for identity, entry in _recent_copies.items() if entry[2] < now]:
+            del _recent_copies[identity]
+
+def reset_recent_copies():
+    with _lock:
+        _recent_copies.clear()
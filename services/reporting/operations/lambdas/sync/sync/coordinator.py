@@ -0,0 +1,196 @@
+import json
+import os
+import time
+import logging
+from .clients import get_s3_client, get_bucket_client
+from .dispatch import LambdaDispatcher, LocalDispatcher
+from .full_sync import handler as full_sync_handler, list_pages
+from .mirror import DEFAULT_MAX_DELETES
+from .state import is_state_key
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Number of shard workers running at the same time, overridable per event with 'shardConcurrency'
+DEFAULT_SHARD_CONCURRENCY = int(os.environ.get('SYNC_SHARD_CONCURRENCY', '10'))
+
+# Time kept back from the coordinator's own budget when handing a budget to shard workers
+SHARD_TIME_MARGIN_MS = int(os.environ.get('SYNC_SHARD_TIME_MARGIN_MS', '5000'))
+
+# Coordinator settings that are not passed on to shard events
+COORDINATOR_KEYS = ('mode', 'shardDepth', 'shardConcurrency')
+
+def discover_shards(s3_client, bucket, prefix, depth=1):
+    """
+    Discover sub-prefixes (for example billing periods) with delimiter listing, descending
+    'depth' levels below the prefix. Objects sitting directly in an intermediate prefix
+    get their own delimited shard so nothing is missed.
+    """
+    shards = []
+    prefixes = [prefix]
+    for _ in range(depth):
+        next_prefixes = []
+        for current in prefixes:
+            has_objects = False
+            for page in list_pages(s3_client, bucket, current, delimiter='/'):
+                next_prefixes.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+                if page.get('Contents'):
+                    has_objects = True
+            if has_objects:
+                shards.append({'prefix': current, 'delimiter': '/'})
+        prefixes = next_prefixes
+    shards.extend({'prefix': current} for current in prefixes)
+    return shards
+
+def aggregate_results(shards, responses):
+    """
+    Combine the per-shard statistics into a single statistics block.
+    """
+    statistics = {
+        'totalObjects': 0,
+        'copiedObjects': 0,
+        'skippedObjects': 0,
+        'failedObjects': 0
+    }
+    mirror = None
+    failed_shards = []
+    incomplete_shards = []
+    for shard, response in zip(shards, responses):
+        if response.get('statusCode') != 200:
+            logger.error(f"Shard '{shard['prefix']}' failed: {response.get('body')}")
+            failed_shards.append(shard['prefix'])
+            continue
+        body = json.loads(response['body'])
+        for name in statistics:
+            statistics[name] += body['statistics'].get(name, 0)
+        if not body.get('complete', True):
+            incomplete_shards.append(shard['prefix'])
+        if 'mirror' in body:
+            mirror = mirror or {'staleObjects': 0, 'deletedObjects': 0, 'failedDeletes': 0, 'capExceeded': False}
+            for name in ('staleObjects', 'deletedObjects', 'failedDeletes'):
+                mirror[name] += body['mirror'][name]
+            mirror['capExceeded'] = mirror['capExceeded'] or body['mirror']['capExceeded']
+    return statistics, failed_shards, incomplete_shards, mirror
+
+def get_shard_deadline(context):
+    """
+    Return the time.monotonic() deadline by which shard workers must finish, keeping a margin
+    of the coordinator's own time to aggregate their results. Each shard's time budget is
+    measured from it when the shard starts.
+    """
+    if context is None:
+        return None
+    return time.monotonic() + (context.get_remaining_time_in_millis() - SHARD_TIME_MARGIN_MS) / 1000
+
+def mirror_shards(dispatcher, shards, responses, base_event, mirror, deadline):
+    """
+    Delete stale objects after a dry-run pass, enforcing 'maxDeletes' across the whole run: nothing
+    is deleted when the shards found more stale objects in total than the cap, otherwise each shard
+    with stale objects runs again capped at the count it found. Returns the shards that failed or
+    did not complete, and updates the mirror result in place.
+    """
+    max_deletes = DEFAULT_MAX_DELETES if base_event.get('maxDeletes') is None else int(base_event['maxDeletes'])
+    mirror['capExceeded'] = mirror['staleObjects'] > max_deletes
+    if mirror['capExceeded']:
+        logger.error(f"Refusing to delete {mirror['staleObjects']} objects across shards: above the cap of {max_deletes}")
+        return [], []
+
+    stale_shards = []
+    for shard, response in zip(shards, responses):
+        stale_objects = json.loads(response['body'])['mirror']['staleObjects']
+        if stale_objects:
+            stale_shards.append((shard, stale_objects))
+    if not stale_shards:
+        return [], []
+
+    delete_responses = dispatcher.dispatch([
+        {**base_event, **shard, 'dryRun': False, 'maxDeletes': stale_objects} for shard, stale_objects in stale_shards
+    ], deadline)
+    _, failed_shards, incomplete_shards, deletes = aggregate_results([shard for shard, _ in stale_shards],
+                                                                      delete_responses)
+    if deletes is not None:
+        for name in ('deletedObjects', 'failedDeletes', 'capExceeded'):
+            mirror[name] = deletes[name]
+    return failed_shards, incomplete_shards
+
+def handler(event, context, dispatcher=None):
+    """
+    Split a full_sync into prefix shards, run each shard as a separate worker and aggregate
+    the results. Shards that checkpoint are resumed by running the coordinator again. Mirror
+    runs first sync every shard as a dry run, so the delete cap holds for the run as a whole.
+    """
+    logger.info("Event received: %s", json.dumps(event))
+
+    try:
+        source_bucket = event.get('sourceBucket')
+        prefix = event.get('prefix', '')
+        if not source_bucket:
+            raise ValueError("Source bucket not specified in event")
+
+        source_region = event.get('region')
+        if not source_region:
+            raise ValueError("Region not specified in event")
+
+        shard_depth = int(event.get('shardDepth', 1))
+        shard_concurrency = int(event.get('shardConcurrency', DEFAULT_SHARD_CONCURRENCY))
+
+        s3_client = get_s3_client(source_region)
+        shards = discover_shards(s3_client, source_bucket, prefix, shard_depth)
+
+        # Mirror runs also need shards for sub-prefixes that only remain in the destination
+        if event.get('mirror'):
+            destination_bucket = os.environ.get('DESTINATION_BUCKET')
+            dest_client = get_bucket_client(destination_bucket, os.environ.get('AWS_REGION', source_region))
+            for shard in discover_shards(dest_client, destination_bucket, prefix, shard_depth):
+                if shard not in shards and not is_state_key(shard['prefix']):
+                    shards.append(shard)
+        logger.info(f"Discovered {len(shards)} shards under prefix '{prefix}'")
+
+        base_event = {k: v for k, v in event.items() if k not in COORDINATOR_KEYS}
+        deadline = get_shard_deadline(context)
+        delete_stale = event.get('mirror') and not event.get('dryRun')
+        shard_events = [{**base_event, **shard, **({'dryRun': True} if delete_stale else {})} for shard in shards]
+
+        if dispatcher is None:
+            if context is not None:
+                dispatcher = LambdaDispatcher(context.function_name, max_workers=shard_concurrency)
+            else:
+                dispatcher = LocalDispatcher(full_sync_handler, max_workers=shard_concurrency)
+
+        responses = dispatcher.dispatch(shard_events, deadline)
+        statistics, failed_shards, incomplete_shards, mirror = aggregate_results(shards, responses)
+
+        # Stale objects are only deleted once every shard has been synced and counted
+        if delete_stale and mirror is not None:
+            if failed_shards or incomplete_shards:
+                logger.info("Not deleting stale objects until every shard has completed")
+            else:
+                failed_shards, incomplete_shards = mirror_shards(dispatcher, shards, responses, base_event, mirror,
+                                                                 deadline)
+
+        logger.info(f"Sharded sync finished. Shards: {len(shards)}, Failed: {len(failed_shards)}, " +
+                    f"Incomplete: {len(incomplete_shards)}, Copied: {statistics['copiedObjects']}")
+
+        body = {
+            'message': 'S3 sharded sync operation completed',
+            'complete': not failed_shards and not incomplete_shards,
+            'shards': len(shards),
+            'failedShards': failed_shards,
+            'incompleteShards': incomplete_shards,
+            'statistics': statistics
+        }
+        if mirror is not None:
+            body['mirror'] = mirror
+
+        return {
+            'statusCode': 500 if failed_shards else 200,
+            'body': json.dumps(body)
+        }
+
+    except Exception as e:
+        logger.error(f"Error in S3 sharded sync operation: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error in S3 sharded sync operation: {str(e)}')
+        }
@@ -0,0 +1,66 @@
+import os
+import re
+import json
+import posixpath
+import logging
+from .inventory import parse_s3_uri
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Copy CUR report files through their manifest instead of one notification per file
+CUR_MANIFESTS = os.environ.get('SYNC_CUR_MANIFESTS', 'false').lower() == 'true'
+
+MANIFEST_SUFFIX = 'Manifest.json'
+
+# Billing period folder of legacy CUR (20240501-20240601/) and Data Exports (BILLING_PERIOD=2024-05/)
+PERIOD_PATTERN = re.compile(r'^(.*?(?:\d{8}-\d{8}|BILLING_PERIOD=[^/]+)/)')
+
+def get_period_prefix(key):
+    """
+    Return the key prefix up to and including the billing period folder, or None outside one.
+    """
+    match = PERIOD_PATTERN.match(key)
+    return match.group(1) if match else None
+
+def is_report_manifest(key):
+    return key.endswith(MANIFEST_SUFFIX) and get_period_prefix(key) is not None
+
+def is_report_file(key):
+    """
+    Check whether a key is a report data file that its manifest copies.
+    """
+    return not key.endswith(MANIFEST_SUFFIX) and get_period_prefix(key) is not None
+
+def load_report_manifest(s3_client, bucket, key):
+    return json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+def get_report_keys(manifest):
+    """
+    Return the report files of the current assembly: 'reportKeys' in legacy CUR manifests,
+    'dataFiles' S3 URIs in Data Exports manifests.
+    """
+    if 'reportKeys' in manifest:
+        return list(manifest['reportKeys'])
+    return [parse_s3_uri(uri)[1] for uri in manifest.get('dataFiles', [])]
+
+def is_assembly_manifest(manifest_key, report_keys):
+    """
+    Legacy CUR also writes a copy of the manifest into the assembly folder next to the report files.
+    """
+    return posixpath.dirname(manifest_key) in {posixpath.dirname(key) for key in report_keys}
+
+def find_superseded_keys(destination_keys, report_keys, manifest_key):
+    """
+    Return destination keys in the billing period that the current assembly no longer contains:
+    files of earlier assemblies and parts an overwritten report dropped. Manifests next to the
+    current files or the processed manifest are kept.
+    """
+    current = set(report_keys)
+    keep_directories = {posixpath.dirname(key) for key in report_keys} | {posixpath.dirname(manifest_key)}
+    return sorted(
+        key for key in destination_keys
+        if key not in current and key != manifest_key
+        and not (key.endswith(MANIFEST_SUFFIX) and posixpath.dirname(key) in keep_directories)
+    )
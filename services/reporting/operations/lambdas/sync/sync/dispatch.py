@@ -0,0 +1,86 @@
+import json
+import os
+import time
+import boto3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Shards are not started once less than this much of the coordinator's deadline is left
+MIN_SHARD_TIME_MS = int(os.environ.get('SYNC_MIN_SHARD_TIME_MS', '10000'))
+
+def start_shard(run, event, deadline=None):
+    """
+    Run a shard event with the time left until the deadline (a time.monotonic() value) as its
+    time budget, measured when the shard starts rather than when the shards were dispatched.
+    Shards that cannot start in time are reported as incomplete without running.
+    """
+    if deadline is None:
+        return run(event)
+    budget_ms = int((deadline - time.monotonic()) * 1000)
+    if budget_ms < MIN_SHARD_TIME_MS:
+        logger.info(f"Not starting shard for prefix '{event.get('prefix')}', {budget_ms} ms left")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Shard not started before the deadline',
+                'complete': False,
+                'statistics': {}
+            })
+        }
+    return run({**event, 'timeBudgetMs': budget_ms})
+
+
+class LocalDispatcher:
+    """
+    Runs shard events in-process on a thread pool by calling a handler directly.
+    Used in tests and for local backfills in place of Lambda invocations.
+    """
+
+    def __init__(self, handler, max_workers=4):
+        self.handler = handler
+        self.max_workers = max_workers
+
+    def dispatch(self, events, deadline=None):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(
+                lambda event: start_shard(lambda shard_event: self.handler(shard_event, None), event, deadline), events
+            ))
+
+
+class LambdaDispatcher:
+    """
+    Runs each shard event as a separate synchronous invocation of a Lambda function.
+    Returns the handler responses in the order of the events.
+    """
+
+    def __init__(self, function_name, max_workers=10, lambda_client=None):
+        self.function_name = function_name
+        self.max_workers = max_workers
+        # Shard invocations can run up to the function timeout and must not be retried by the client
+        self.lambda_client = lambda_client or boto3.client(
+            'lambda', config=Config(read_timeout=900, retries={'max_attempts': 0})
+        )
+
+    def invoke(self, event):
+        response = self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(event).encode('utf-8')
+        )
+        payload = json.loads(response['Payload'].read())
+        if 'FunctionError' in response:
+            logger.error(f"Shard invocation for prefix '{event.get('prefix')}' failed: {payload}")
+            return {
+                'statusCode': 500,
+                'body': json.dumps(f"Shard invocation failed: {payload.get('errorMessage')}")
+            }
+        return payload
+
+    def dispatch(self, events, deadline=None):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda event: start_shard(self.invoke, event, deadline), events))
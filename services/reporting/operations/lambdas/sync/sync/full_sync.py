@@ -1,73 +1,266 @@
 import json
 import os
-import boto3
 import logging
-from botocore.exceptions import ClientError
+import time
+import queue
+import threading
+from collections import deque
+from contextlib import ExitStack, closing
+from concurrent.futures import Future, ThreadPoolExecutor
+from .clients import get_s3_client, get_bucket_client
+from .s3_copy import server_side_copy
+from .checksums import objects_match, source_etag_tagging
+from .throttle import AdaptiveLimiter
+from .metrics import SyncMetrics
+from .inventory import build_inventory_index, inventory_pages, parse_s3_uri
+from .state import get_state_key, is_state_key, load_state, save_state, delete_state
+from .manifest import index_entry, load_manifest, save_manifest
+from .mirror import mirror_destination
+from .watermark import WatermarkTracker, load_watermark, save_watermark, parse_timestamp
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def compare_objects(s3_client, source_bucket, destination_bucket, key):
+# Number of objects copied in parallel at the start, overridable per event with 'concurrency';
+# the adaptive limiter moves it between 1 and SYNC_MAX_CONCURRENCY
+DEFAULT_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY', '16'))
+
+# Keys requested per list_objects_v2 page
+PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', '1000'))
+
+# Listing pages fetched ahead of the copy stage; the lister blocks once this many are queued
+PREFETCH_PAGES = int(os.environ.get('SYNC_PREFETCH_PAGES', '2'))
+
+# Pages whose copies may be in flight at once; older pages are finished before new ones are taken
+PIPELINE_PAGES = int(os.environ.get('SYNC_PIPELINE_PAGES', '2'))
+
+# Stop taking new copies and checkpoint once less than this much invocation time remains
+CHECKPOINT_THRESHOLD_MS = int(os.environ.get('SYNC_CHECKPOINT_THRESHOLD_MS', '10000'))
+CHECKPOINT_NAME = 'full_sync.checkpoint.json'
+
+# Manifest of what has been synced, used instead of listing the destination on later runs
+MANIFEST_NAME = 'full_sync.manifest.json.gz'
+
+# Highest source LastModified fully synced, used when the event sets 'watermark'
+WATERMARK_NAME = 'full_sync.watermark.json'
+
+# Source keys seen by a checkpointed mirror run, needed to find deletions once the run completes
+MIRROR_SEEN_NAME = 'full_sync.mirror-seen.json.gz'
+
+def get_sync_state_key(source_bucket, prefix, delimiter, name):
     """
-    Compare objects in source and destination buckets to determine if copy is needed.
-    Returns True if objects are different (or destination doesn't exist), False if they're the same.
+    Build the key of a full_sync state object; delimited shards get their own state.
     """
-    try:
-        # Get source object metadata
-        source_meta = s3_client.head_object(Bucket=source_bucket, Key=key)
-        source_etag = source_meta['ETag']
-        source_size = source_meta['ContentLength']
-        
-        try:
-            # Try to get destination object metadata
-            dest_meta = s3_client.head_object(Bucket=destination_bucket, Key=key)
-            dest_etag = dest_meta['ETag']
-            dest_size = dest_meta['ContentLength']
-            
-            # Compare ETag and size
-            if source_etag == dest_etag and source_size == dest_size:
-                logger.info(f"Object {key} already exists in destination with matching ETag and size")
-                return False
-            else:
-                logger.info(f"Object {key} exists in destination but has different ETag or size")
-                return True
-                
-        except ClientError as e:
-            # If destination object doesn't exist, we need to copy
-            if e.response['Error']['Code'] == '404':
-                logger.info(f"Object {key} does not exist in destination bucket")
+    if delimiter:
+        name = f"delimited.{name}"
+    return get_state_key(source_bucket, prefix, name)
+
+def list_pages(s3_client, bucket, prefix, continuation_token=None, delimiter=None, start_after=None):
+    """
+    Yield list_objects_v2 pages for a prefix, optionally starting from a continuation token or
+    after a key. With a delimiter only the objects directly under the prefix are listed.
+    """
+    while True:
+        kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': PAGE_SIZE}
+        if delimiter:
+            kwargs['Delimiter'] = delimiter
+        if continuation_token:
+            kwargs['ContinuationToken'] = continuation_token
+        elif start_after:
+            kwargs['StartAfter'] = start_after
+        page = s3_client.list_objects_v2(**kwargs)
+        yield page
+        continuation_token = page.get('NextContinuationToken')
+        if not page.get('IsTruncated') or not continuation_token:
+            return
+
+def prefetch_pages(pages, depth=None):
+    """
+    Run a page iterator on a producer thread and hand its pages over through a bounded queue, so
+    the next listing request overlaps with copy work. The producer blocks while the queue is full
+    and stops once the consumer closes the generator. Listing errors are raised in the consumer.
+    """
+    page_queue = queue.Queue(maxsize=max(1, depth or PREFETCH_PAGES))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.1)
                 return True
-            else:
-                # Re-raise other errors
-                raise
-                
-    except Exception as e:
-        logger.error(f"Error comparing {key}: {str(e)}")
-        # When in doubt, copy the object
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(('page', page)):
+                    return
+            put(('done', None))
+        except Exception as e:
+            put(('error', e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = page_queue.get()
+            if kind == 'error':
+                raise value
+            if kind == 'done':
+                return
+            yield value
+    finally:
+        stop.set()
+
+def build_destination_index(s3_client, destination_bucket, prefix, delimiter=None):
+    """
+    List the destination prefix once and index it by object key.
+    Each entry holds the ETag and size reported by list_objects_v2; the source LastModified
+    is unknown until the key is seen in the source listing.
+    """
+    index = {}
+    for page in list_pages(s3_client, destination_bucket, prefix, delimiter=delimiter):
+        for obj in page.get('Contents', []):
+            if is_state_key(obj['Key']):
+                continue
+            index[obj['Key']] = {
+                'ETag': obj.get('ETag'),
+                'Size': obj.get('Size'),
+                'LastModified': None
+            }
+    logger.info(f"Indexed {len(index)} destination objects under prefix '{prefix}'")
+    return index
+
+class DestinationCursor:
+    """
+    Destination listing merged with the source listing. Both come back in key order, so source
+    keys looked up in increasing order only need the current destination page in memory. Offers
+    the get() and item assignment of a destination index; assigned entries are not kept since
+    keys behind the cursor are never looked up again.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.entries = (obj for page in pages for obj in page.get('Contents', []) if not is_state_key(obj['Key']))
+        self.current = next(self.entries, None)
+
+    def get(self, key):
+        while self.current is not None and self.current['Key'] < key:
+            self.current = next(self.entries, None)
+        if self.current is None or self.current['Key'] != key:
+            return None
+        return {'ETag': self.current.get('ETag'), 'Size': self.current.get('Size'), 'LastModified': None}
+
+    def __setitem__(self, key, entry):
+        pass
+
+    def close(self):
+        self.pages.close()
+
+def compare_objects(source_object, destination_index):
+    """
+    Compare a listed source object against the destination index to determine if copy is needed.
+    Returns True if objects are different (or destination doesn't exist), False if they're the same.
+    """
+    key = source_object['Key']
+    dest_object = destination_index.get(key)
+    if dest_object is None:
+        logger.info(f"Object {key} does not exist in destination bucket")
         return True
+    
+    # Compare ETag and size
+    if source_object.get('ETag') == dest_object['ETag'] and source_object.get('Size') == dest_object['Size']:
+        logger.info(f"Object {key} already exists in destination with matching ETag and size")
+        return False
+    
+    logger.info(f"Object {key} exists in destination but has different ETag or size")
+    return True
 
-def copy_object(s3_client, source_bucket, destination_bucket, key):
+def needs_verification(source_object, destination_index):
     """
-    Copy a single object from source to destination bucket
+    Check whether a differing object might still be identical: same size but a different ETag,
+    which multipart uploads and their server-side copies produce for the same bytes. Only entries
+    from a destination listing qualify; manifest entries already hold the source ETag.
     """
+    dest_object = destination_index.get(source_object['Key'])
+    return (dest_object is not None and dest_object['Size'] == source_object.get('Size')
+            and dest_object['LastModified'] is None)
+
+class CopyCancelled(Exception):
+    """
+    Raised instead of starting a copy once the invocation has stopped taking new work.
+    """
+
+def copy_object(s3_client, source_bucket, destination_bucket, key, size=None, source_etag=None, limiter=None,
+                cancelled=None):
+    """
+    Copy a single object from source to destination bucket, recording the source ETag as a tag.
+    Objects above the multipart threshold are copied in parallel parts. With a limiter the copy
+    runs within its concurrency limit and throttled copies are retried with backoff. When the
+    cancelled callable returns True by the time the copy would start, nothing is copied.
+    Returns True, False on failure or None when cancelled.
+    """
+    def copy():
+        if cancelled and cancelled():
+            raise CopyCancelled(key)
+        return server_side_copy(s3_client, source_bucket, destination_bucket, key, size,
+                                tagging=source_etag_tagging(source_etag))
+    
     try:
         logger.info(f"Copying: {source_bucket}/{key} -> {destination_bucket}/{key}")
-        s3_client.copy_object(
-            Bucket=destination_bucket,
-            CopySource={
-                'Bucket': source_bucket,
-                'Key': key
-            },
-            Key=key
-        )
+        if limiter:
+            limiter.run(copy)
+        else:
+            copy()
         return True
+    except CopyCancelled:
+        logger.info(f"Not copying {key}, the invocation is stopping")
+        return None
     except Exception as e:
         logger.error(f"Error copying {key}: {str(e)}")
         return False
 
-def handler(event, _):
+def sync_object(s3_client, source_bucket, destination_bucket, source_object, source_client=None, verify=False,
+                limiter=None, cancelled=None):
+    """
+    Copy a single listed object on a worker thread using a pooled S3 client. With verify, objects
+    whose ETags differ are first checked by recorded source ETag and checksums.
+    Returns 'copied', 'skipped', 'failed' or 'cancelled'.
+    """
+    if verify and objects_match(source_client or s3_client, s3_client, source_bucket, destination_bucket, source_object):
+        return 'skipped'
+    copied = copy_object(s3_client, source_bucket, destination_bucket, source_object['Key'],
+                         source_object.get('Size'), source_object.get('ETag'), limiter, cancelled)
+    if copied is None:
+        return 'cancelled'
+    return 'copied' if copied else 'failed'
+
+def get_concurrency(event):
+    """
+    Resolve the worker pool size from the event, falling back to SYNC_CONCURRENCY.
+    """
+    concurrency = int(event.get('concurrency', DEFAULT_CONCURRENCY))
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+    return concurrency
+
+def time_is_low(context, deadline=None):
+    """
+    Check whether the invocation is close enough to its timeout (or to the time budget
+    given by a coordinator) that it should checkpoint.
+    """
+    if deadline is not None and (deadline - time.monotonic()) * 1000 < CHECKPOINT_THRESHOLD_MS:
+        return True
+    if context is None:
+        return False
+    return context.get_remaining_time_in_millis() < CHECKPOINT_THRESHOLD_MS
+
+def handler(event, context):
     logger.info("Event received: %s", json.dumps(event))
+    metrics = None
     
     try:
         # Parse event
@@ -83,66 +276,288 @@ def handler(event, _):
         if not source_region:
             raise ValueError("Region not specified in event")
         
-        logger.info(f"Syncing from {source_bucket} to {destination_bucket} with prefix '{prefix}'")
+        concurrency = get_concurrency(event)
         
-        # Create S3 client
-        s3_client = boto3.client('s3', region_name=source_region)
+        # Shards dispatched by a coordinator may list only direct children and carry a time budget
+        delimiter = event.get('delimiter')
         
-        # Log client region for debugging
-        client_region = s3_client.meta.region_name
-        logger.info(f"S3 client is using region: {client_region}")
+        # S3 Inventory manifests (s3://bucket/.../manifest.json) can replace the source and destination listings
+        source_inventory = event.get('sourceInventory')
+        destination_inventory = event.get('destinationInventory')
+        if source_inventory and delimiter:
+            raise ValueError("A source inventory cannot be combined with a delimiter")
+        # An inventory is a snapshot up to a week old; objects created since would be deleted as stale
+        if source_inventory and event.get('mirror'):
+            raise ValueError("A source inventory cannot be combined with mirror")
+        deadline = None
+        if event.get('timeBudgetMs'):
+            deadline = time.monotonic() + int(event['timeBudgetMs']) / 1000
         
-        # Get all objects with the specified prefix
-        paginator = s3_client.get_paginator('list_objects_v2')
-        page_iterator = paginator.paginate(Bucket=source_bucket, Prefix=prefix)
+        logger.info(f"Syncing from {source_bucket} to {destination_bucket} with prefix '{prefix}' " +
+                    f"using {concurrency} workers")
+        metrics = SyncMetrics('full_sync', source_bucket, prefix)
         
-        total_objects = 0
-        copied_objects = 0
-        skipped_objects = 0
-        failed_objects = 0
+        # Pooled S3 clients: the source is listed in its own region, while the destination
+        # (copies, listing and state objects) goes through the destination bucket's regional endpoint
+        s3_client = get_s3_client(source_region)
+        dest_client = get_bucket_client(destination_bucket, os.environ.get('AWS_REGION', source_region))
         
-        # Process each page of results
-        for page in page_iterator:
-            if 'Contents' not in page:
-                logger.info(f"No objects found with prefix '{prefix}'")
-                continue
-                
-            # Process each object
-            for obj in page['Contents']:
-                key = obj['Key']
-                total_objects += 1
-                
-                # Skip directories/folders (objects that end with '/')
-                if key.endswith('/'):
-                    logger.info(f"Skipping directory: {key}")
-                    skipped_objects += 1
+        # Log client regions for debugging
+        logger.info(f"S3 clients are using regions: source {s3_client.meta.region_name}, " +
+                    f"destination {dest_client.meta.region_name}")
+        
+        # Resume from a checkpoint left by a previous invocation unless a restart is requested. A stored
+        # checkpoint that is not resumed is still removed once this run completes, so later runs start over
+        checkpoint_key = get_sync_state_key(source_bucket, prefix, delimiter, CHECKPOINT_NAME)
+        stored_checkpoint = load_state(dest_client, destination_bucket, checkpoint_key)
+        checkpoint = None if event.get('restart') else stored_checkpoint
+        if checkpoint and checkpoint.get('sourceInventory') != source_inventory:
+            # Inventory and listing continuation tokens cannot be exchanged
+            logger.info("Ignoring checkpoint taken with a different source listing")
+            checkpoint = None
+        
+        # Mirror runs track every listed source key so removed objects can be deleted at the end. Keys
+        # before a checkpoint are only known from the state a mirror run saved with it, so plain and
+        # mirror runs never resume each other's checkpoints
+        mirror = event.get('mirror', False)
+        if checkpoint and bool(checkpoint.get('mirror')) != bool(mirror):
+            logger.info("Ignoring checkpoint taken by a run with a different mirror mode")
+            checkpoint = None
+        mirror_seen_key = get_sync_state_key(source_bucket, prefix, delimiter, MIRROR_SEEN_NAME)
+        source_keys = set()
+        seen = None
+        if mirror and checkpoint:
+            seen = load_state(dest_client, destination_bucket, mirror_seen_key, compressed=True)
+            if seen is None:
+                logger.info("Ignoring mirror checkpoint without the source keys listed before it")
+                checkpoint = None
+            else:
+                source_keys = set(seen)
+        # Whether source_keys covers the whole source listing once this run has consumed the rest of it
+        lists_all_source_keys = not checkpoint or seen is not None
+        
+        # Listings resume after the last finished key; inventories by the number of objects consumed
+        if checkpoint:
+            logger.info(f"Resuming sync after key '{checkpoint['lastKey']}'")
+            statistics = checkpoint['statistics']
+            resume = {'lastKey': checkpoint['lastKey'], 'consumed': int(checkpoint.get('continuationToken') or 0)}
+        else:
+            statistics = {
+                'totalObjects': 0,
+                'copiedObjects': 0,
+                'skippedObjects': 0,
+                'failedObjects': 0
+            }
+            resume = {'lastKey': None, 'consumed': 0}
+        
+        # Skip objects modified before the watermark; an explicit 'since' overrides the stored one
+        watermark_key = get_sync_state_key(source_bucket, prefix, delimiter, WATERMARK_NAME)
+        use_watermark = event.get('watermark', False)
+        threshold = parse_timestamp(event.get('since'))
+        if threshold is None and use_watermark:
+            threshold = load_watermark(dest_client, destination_bucket, watermark_key)
+        if threshold:
+            logger.info(f"Skipping objects last modified before {threshold.isoformat()}")
+        watermark = WatermarkTracker(threshold, checkpoint.get('watermarkProgress') if checkpoint else None)
+        
+        # Manifest runs diff against the manifest of earlier runs and keep it up to date. They, mirror
+        # runs and inventory runs hold a full destination index, from the manifest, a destination
+        # inventory or a listing. Other runs merge the destination listing with the source listing
+        # page by page, so memory stays flat whatever the size of the prefix
+        use_manifest = event.get('manifest', False)
+        manifest_key = get_sync_state_key(source_bucket, prefix, delimiter, MANIFEST_NAME)
+        destination_index = None
+        if destination_inventory:
+            inventory_client = get_bucket_client(parse_s3_uri(destination_inventory)[0], source_region)
+            destination_index = build_inventory_index(inventory_client, destination_inventory, prefix, delimiter)
+        elif use_manifest and not event.get('refreshManifest'):
+            destination_index = load_manifest(dest_client, destination_bucket, manifest_key)
+        if destination_index is None and (use_manifest or mirror or source_inventory):
+            destination_index = build_destination_index(dest_client, destination_bucket, prefix, delimiter)
+        elif destination_index is None:
+            destination_index = DestinationCursor(prefetch_pages(
+                list_pages(dest_client, destination_bucket, prefix, delimiter=delimiter, start_after=resume['lastKey'])
+            ))
+        
+        # Pipeline: a producer thread lists pages into a bounded queue, this thread compares them and
+        # the worker pool copies. At most PIPELINE_PAGES pages are in flight, so a slow copy stage
+        # stops page intake and the full queue in turn pauses listing. The adaptive limiter keeps
+        # in-flight copies close to what S3 accepts for the prefix
+        limiter = AdaptiveLimiter(concurrency, event.get('maxConcurrency'))
+        
+        # Pages in flight, each a list of (object, outcome) in listing order; the outcome is a copy
+        # future, 'skipped' for unchanged objects or 'ignored' for directories and objects before
+        # the watermark. Statistics and the resume point only advance over objects finished in order
+        pending = deque()
+        stopping = threading.Event()
+        
+        # Copy on a worker thread, recording the copy latency and size. Once the invocation stops,
+        # copies that have not started are cancelled except the oldest, so every run makes progress
+        def sync_and_measure(obj, verify):
+            started = time.monotonic()
+            result = sync_object(dest_client, source_bucket, destination_bucket, obj, s3_client, verify, limiter,
+                                 lambda: stopping.is_set() and obj is not resume.get('oldest'))
+            if result == 'copied':
+                metrics.record_copy((time.monotonic() - started) * 1000, obj.get('Size'))
+            elif result == 'failed':
+                metrics.record_failure()
+            return result
+        
+        def stop_pending():
+            outcomes = [(obj, outcome) for entries in pending for obj, outcome in entries]
+            if outcomes:
+                resume['oldest'] = outcomes[0][0]
+            stopping.set()
+            for _, outcome in outcomes[1:]:
+                if isinstance(outcome, Future):
+                    outcome.cancel()
+        
+        # Collect the outcomes of the oldest page in flight. Objects finished after a cancelled one
+        # are kept in the index but only counted once the next run lists them again
+        def finish_page():
+            for obj, outcome in pending.popleft():
+                if isinstance(outcome, Future):
+                    outcome = 'cancelled' if outcome.cancelled() else outcome.result()
+                if outcome == 'cancelled':
+                    resume['interrupted'] = True
+                    continue
+                if outcome in ('copied', 'skipped'):
+                    destination_index[obj['Key']] = index_entry(obj)
+                if resume.get('interrupted'):
+                    continue
+                statistics['totalObjects'] += 1
+                if outcome == 'copied':
+                    statistics['copiedObjects'] += 1
+                elif outcome in ('skipped', 'ignored'):
+                    statistics['skippedObjects'] += 1
+                else:
+                    statistics['failedObjects'] += 1
+                    watermark.failed(obj)
+                resume['lastKey'] = obj['Key']
+                resume['consumed'] += 1
+        
+        if source_inventory:
+            inventory_client = get_bucket_client(parse_s3_uri(source_inventory)[0], source_region)
+            listing = inventory_pages(inventory_client, source_inventory, prefix, resume['consumed'] or None,
+                                      PAGE_SIZE)
+        else:
+            listing = list_pages(s3_client, source_bucket, prefix, delimiter=delimiter, start_after=resume['lastKey'])
+        pages = prefetch_pages(listing)
+        taken = 0
+        with ExitStack() as stack:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=limiter.maximum))
+            stack.enter_context(closing(pages))
+            if isinstance(destination_index, DestinationCursor):
+                stack.enter_context(closing(destination_index))
+            for page in pages:
+                if 'Contents' not in page:
+                    logger.info(f"No objects found with prefix '{prefix}'")
                     continue
                 
-                # Check if we need to copy this object
-                if compare_objects(s3_client, source_bucket, destination_bucket, key):
-                    # Objects are different, copy required
-                    if copy_object(s3_client, source_bucket, destination_bucket, key):
-                        copied_objects += 1
+                entries = []
+                pending.append(entries)
+                for obj in page['Contents']:
+                    # Stop taking new objects before the invocation times out, once this run made progress
+                    if taken and time_is_low(context, deadline):
+                        stop_pending()
+                        break
+                    taken += 1
+                    
+                    key = obj['Key']
+                    if mirror:
+                        source_keys.add(key)
+                    
+                    # Skip directories/folders (objects that end with '/')
+                    if key.endswith('/'):
+                        logger.info(f"Skipping directory: {key}")
+                        entries.append((obj, 'ignored'))
+                        continue
+                    
+                    # Objects older than the watermark were synced by an earlier run
+                    if watermark.is_before(obj):
+                        entries.append((obj, 'ignored'))
+                        continue
+                    watermark.observe(obj)
+                    
+                    # Check if we need to copy this object
+                    if compare_objects(obj, destination_index):
+                        verify = needs_verification(obj, destination_index)
+                        entries.append((obj, executor.submit(sync_and_measure, obj, verify)))
                     else:
-                        failed_objects += 1
-                else:
-                    # Objects are the same, skip copy
-                    skipped_objects += 1
+                        entries.append((obj, 'skipped'))
+                
+                if stopping.is_set():
+                    break
+                while len(pending) > PIPELINE_PAGES:
+                    finish_page()
+            
+            while pending:
+                finish_page()
+        
+        # Persist progress up to the last key everything before which has finished
+        if stopping.is_set():
+            if use_manifest:
+                save_manifest(dest_client, destination_bucket, manifest_key, destination_index)
+            if mirror:
+                save_state(dest_client, destination_bucket, mirror_seen_key, sorted(source_keys), compressed=True)
+            save_state(dest_client, destination_bucket, checkpoint_key, {
+                'lastKey': resume['lastKey'],
+                'continuationToken': str(resume['consumed']) if source_inventory else None,
+                'statistics': statistics,
+                'watermarkProgress': watermark.progress(),
+                'sourceInventory': source_inventory,
+                'mirror': bool(mirror)
+            })
+            logger.info(f"Sync checkpointed after '{resume['lastKey']}'. Total: {statistics['totalObjects']}, " +
+                        f"Copied: {statistics['copiedObjects']}, Skipped: {statistics['skippedObjects']}, " +
+                        f"Failed: {statistics['failedObjects']}")
+            metrics.record_throttles(limiter.statistics()['throttledRequests'])
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'S3 sync operation checkpointed',
+                    'complete': False,
+                    'statistics': statistics,
+                    'throttle': limiter.statistics()
+                })
+            }
+        
+        # Destination keys missing from an incomplete source key set would be deleted as stale
+        mirror_result = None
+        if mirror and not lists_all_source_keys:
+            raise RuntimeError("Mirror run resumed without the source keys listed before its checkpoint")
+        if mirror:
+            mirror_result = mirror_destination(dest_client, destination_bucket, destination_index, source_keys,
+                                               event.get('maxDeletes'), event.get('dryRun', False))
+        
+        if use_manifest:
+            save_manifest(dest_client, destination_bucket, manifest_key, destination_index)
         
-        logger.info(f"Sync completed. Total: {total_objects}, Copied: {copied_objects}, " +
-                    f"Skipped: {skipped_objects}, Failed: {failed_objects}")
+        # Only advance the stored watermark on watermark runs without a targeted 'since' override
+        if use_watermark and not event.get('since') and watermark.next_watermark():
+            save_watermark(dest_client, destination_bucket, watermark_key, watermark.next_watermark())
+        
+        if stored_checkpoint:
+            delete_state(dest_client, destination_bucket, checkpoint_key)
+            if stored_checkpoint.get('mirror'):
+                delete_state(dest_client, destination_bucket, mirror_seen_key)
+        
+        logger.info(f"Sync completed. Total: {statistics['totalObjects']}, Copied: {statistics['copiedObjects']}, " +
+                    f"Skipped: {statistics['skippedObjects']}, Failed: {statistics['failedObjects']}")
+        
+        body = {
+            'message': 'S3 sync operation completed',
+            'complete': True,
+            'statistics': statistics,
+            'throttle': limiter.statistics()
+        }
+        if mirror_result is not None:
+            body['mirror'] = mirror_result
+        metrics.record_throttles(limiter.statistics()['throttledRequests'])
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'message': 'S3 sync operation completed',
-                'statistics': {
-                    'totalObjects': total_objects,
-                    'copiedObjects': copied_objects,
-                    'skippedObjects': skipped_objects,
-                    'failedObjects': failed_objects
-                }
-            })
+            'body': json.dumps(body)
         }
     
     except Exception as e:
@@ -150,4 +565,7 @@ def handler(event, _):
         return {
             'statusCode': 500,
             'body': json.dumps(f'Error in S3 sync operation: {str(e)}')
-        }
\ No newline at end of file
+        }
+    finally:
+        if metrics:
+            metrics.emit()
@@ -4,6 +4,8 @@ import boto3
 import logging
 from .object_sync import handler as object_sync_handler
 from .full_sync import handler as full_sync_handler
+from .coordinator import handler as coordinator_handler
+from .planner import handler as planner_handler
 
 # Set up logging
 logger = logging.getLogger()
@@ -20,10 +22,22 @@ def get_object_size(s3_client, bucket, key):
 def handler(event, context):
     """
     Main handler that routes the request to either object_sync or full_sync based on the action field.
-    If action is 'full_sync', it routes to full_sync handler, otherwise it routes to object_sync handler.
+    If action is 'full_sync', it routes to full_sync handler (or the sharding coordinator when mode is
+    'coordinator'), if action is 'plan' it routes to the dry-run planner, otherwise it routes to
+    object_sync handler.
     """
     logger.info("Event received: %s", json.dumps(event))
     
+    # Check if this is a dry-run plan request
+    if event.get('action') == 'plan':
+        logger.info("Routing to sync planner")
+        return planner_handler(event, context)
+    
+    # Check if this is a sharded full sync request
+    if event.get('action') == 'full_sync' and event.get('mode') == 'coordinator':
+        logger.info("Routing to full sync coordinator")
+        return coordinator_handler(event, context)
+    
     # Check if this is a full sync request
     if event.get('action') == 'full_sync':
         logger.info("Routing to full sync handler")
@@ -0,0 +1,53 @@
+import logging
+from .state import load_state, save_state
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Bump when the entry layout changes; manifests with another version are rebuilt from a listing
+MANIFEST_VERSION = 1
+
+def index_entry(source_object):
+    """
+    Build a destination index entry from a listed source object.
+    """
+    last_modified = source_object.get('LastModified')
+    if hasattr(last_modified, 'isoformat'):
+        last_modified = last_modified.isoformat()
+    return {
+        'ETag': source_object.get('ETag'),
+        'Size': source_object.get('Size'),
+        'LastModified': last_modified
+    }
+
+def load_manifest(s3_client, bucket, key):
+    """
+    Load the sync manifest as a destination index keyed by object key.
+    Returns None when there is no usable manifest.
+    """
+    manifest = load_state(s3_client, bucket, key, compressed=True)
+    if manifest is None:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        logger.info(f"Ignoring manifest {key} with version {manifest.get('version')}")
+        return None
+
+    index = {
+        object_key: {'ETag': etag, 'Size': size, 'LastModified': last_modified}
+        for object_key, (etag, size, last_modified) in manifest['objects'].items()
+    }
+    logger.info(f"Loaded manifest with {len(index)} objects from {bucket}/{key}")
+    return index
+
+def save_manifest(s3_client, bucket, key, index):
+    """
+    Store the destination index as a compact, gzip compressed manifest.
+    """
+    save_state(s3_client, bucket, key, {
+        'version': MANIFEST_VERSION,
+        'objects': {
+            object_key: [entry['ETag'], entry['Size'], entry['LastModified']]
+            for object_key, entry in index.items()
+        }
+    }, compressed=True)
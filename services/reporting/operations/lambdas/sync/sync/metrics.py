@@ -0,0 +1,163 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# CloudWatch namespace of the Embedded Metric Format documents; set SYNC_METRICS to 'false' to disable them
+NAMESPACE = os.environ.get('SYNC_METRICS_NAMESPACE', 'Cloud2/ReportingSync')
+METRICS_ENABLED = os.environ.get('SYNC_METRICS', 'true').lower() != 'false'
+
+# Dimension sets: per source bucket and prefix, and per operation for overall alarms
+DIMENSIONS = [['Operation', 'SourceBucket', 'Prefix'], ['Operation']]
+
+# API call counts are process-wide and cannot be split by bucket and prefix, so they are only
+# emitted per operation
+API_CALL_METRICS = ('HeadRequests', 'ListRequests')
+API_CALL_DIMENSIONS = [['Operation']]
+
+# S3 API calls made by all pooled clients in this process, counted by operation name
+_api_calls = Counter()
+_lock = threading.Lock()
+
+def record_api_call(model, **_):
+    """
+    botocore 'before-call' hook counting each S3 API call made by a pooled client.
+    """
+    with _lock:
+        _api_calls[model.name] += 1
+
+def get_api_calls():
+    with _lock:
+        return Counter(_api_calls)
+
+def top_level_prefix(key):
+    """
+    First path segment of a key including its '/', or '' for keys at the bucket root.
+    """
+    head, separator, _ = key.partition('/')
+    return head + separator if separator else ''
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of values, None when it is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def get_event_lag_ms(event_time):
+    """
+    Milliseconds between an S3 event time and now.
+    """
+    if not event_time:
+        return None
+    try:
+        event_time = datetime.fromisoformat(event_time)
+    except ValueError:
+        return None
+    if event_time.tzinfo is None:
+        event_time = event_time.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - event_time).total_seconds() * 1000
+
+
+class SyncMetrics:
+    """
+    Collects throughput, copy latency and sync lag for one sync invocation and writes them to
+    stdout as a CloudWatch Embedded Metric Format document. HEAD and list calls are taken from
+    the process-wide API call counts, so concurrent shards in one process share them; when
+    several metrics objects run side by side only one should count them.
+    """
+
+    def __init__(self, operation, source_bucket, prefix='', count_api_calls=True):
+        self.operation = operation
+        self.source_bucket = source_bucket
+        self.prefix = prefix
+        self.started = time.monotonic()
+        self.api_calls = get_api_calls() if count_api_calls else None
+        self.copied_objects = 0
+        self.failed_objects = 0
+        self.copied_bytes = 0
+        self.throttled_requests = 0
+        self.latencies = []
+        self.lags = []
+        self.lock = threading.Lock()
+
+    def record_copy(self, latency_ms, size=None, event_time=None):
+        lag = get_event_lag_ms(event_time)
+        with self.lock:
+            self.copied_objects += 1
+            self.copied_bytes += size or 0
+            self.latencies.append(latency_ms)
+            if lag is not None:
+                self.lags.append(lag)
+
+    def record_failure(self):
+        with self.lock:
+            self.failed_objects += 1
+
+    def record_throttles(self, count):
+        with self.lock:
+            self.throttled_requests += count
+
+    def values(self):
+        """
+        Metric values and units for this invocation; percentiles are left out when nothing was copied.
+        """
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        values = {
+            'ObjectsCopied': (self.copied_objects, 'Count'),
+            'ObjectsFailed': (self.failed_objects, 'Count'),
+            'BytesCopied': (self.copied_bytes, 'Bytes'),
+            'ObjectsPerSecond': (self.copied_objects / elapsed, 'Count/Second'),
+            'BytesPerSecond': (self.copied_bytes / elapsed, 'Bytes/Second'),
+            'ThrottledRequests': (self.throttled_requests, 'Count')
+        }
+        if self.api_calls is not None:
+            calls = get_api_calls() - self.api_calls
+            values['HeadRequests'] = (calls['HeadObject'], 'Count')
+            values['ListRequests'] = (calls['ListObjectsV2'], 'Count')
+        for name, fraction in (('P50', 0.5), ('P90', 0.9), ('P99', 0.99)):
+            if self.latencies:
+                values[f'CopyLatency{name}'] = (percentile(self.latencies, fraction), 'Milliseconds')
+        if self.lags:
+            values['SyncLagP50'] = (percentile(self.lags, 0.5), 'Milliseconds')
+            values['SyncLagMax'] = (max(self.lags), 'Milliseconds')
+        return values
+
+    def emit(self):
+        if not METRICS_ENABLED:
+            return
+        values = self.values()
+        directives = [{
+            'Namespace': NAMESPACE,
+            'Dimensions': DIMENSIONS,
+            'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()
+                        if name not in API_CALL_METRICS]
+        }]
+        if self.api_calls is not None:
+            directives.append({
+                'Namespace': NAMESPACE,
+                'Dimensions': API_CALL_DIMENSIONS,
+                'Metrics': [{'Name': name, 'Unit': values[name][1]} for name in API_CALL_METRICS]
+            })
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': directives
+            },
+            'Operation': self.operation,
+            'SourceBucket': self.source_bucket,
+            'Prefix': self.prefix or '/',
+            **{name: value for name, (value, _) in values.items()}
+        }
+        # EMF documents must be written as bare JSON lines, not through the log formatter
+        print(json.dumps(document), flush=True)
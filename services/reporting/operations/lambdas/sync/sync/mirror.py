@@ -0,0 +1,73 @@
+import os
+import logging
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Mirror runs refuse to delete more than this many objects, overridable per event with 'maxDeletes'
+DEFAULT_MAX_DELETES = int(os.environ.get('SYNC_MAX_DELETES', '1000'))
+
+# Number of stale keys included in mirror results for review
+SAMPLE_SIZE = 10
+
+def find_stale_keys(destination_index, source_keys):
+    """
+    Return the destination keys that no longer exist in the source, in key order.
+    """
+    return sorted(key for key in destination_index if key not in source_keys)
+
+def delete_keys(s3_client, bucket, keys):
+    """
+    Delete keys with batched DeleteObjects calls. Returns the keys that were deleted and the failed ones.
+    """
+    deleted = []
+    failed = []
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        errors = {error['Key'] for error in response.get('Errors', [])}
+        for error in response.get('Errors', []):
+            logger.error(f"Error deleting {error['Key']}: {error.get('Code')} {error.get('Message')}")
+        deleted.extend(key for key in batch if key not in errors)
+        failed.extend(key for key in batch if key in errors)
+    return deleted, failed
+
+def mirror_destination(s3_client, bucket, destination_index, source_keys, max_deletes=None, dry_run=False):
+    """
+    Remove destination objects that are gone from the source, unless this is a dry run or the
+    number of deletes exceeds the safety cap. Deleted keys are dropped from the destination index.
+    """
+    max_deletes = DEFAULT_MAX_DELETES if max_deletes is None else int(max_deletes)
+    stale_keys = find_stale_keys(destination_index, source_keys)
+    result = {
+        'staleObjects': len(stale_keys),
+        'deletedObjects': 0,
+        'failedDeletes': 0,
+        'dryRun': dry_run,
+        'capExceeded': len(stale_keys) > max_deletes,
+        'sample': stale_keys[:SAMPLE_SIZE]
+    }
+
+    if not stale_keys:
+        return result
+    if dry_run:
+        logger.info(f"Dry run: would delete {len(stale_keys)} objects from {bucket}")
+        return result
+    if result['capExceeded']:
+        logger.error(f"Refusing to delete {len(stale_keys)} objects from {bucket}: above the cap of {max_deletes}")
+        return result
+
+    deleted, failed = delete_keys(s3_client, bucket, stale_keys)
+    for key in deleted:
+        destination_index.pop(key, None)
+    result['deletedObjects'] = len(deleted)
+    result['failedDeletes'] = len(failed)
+    logger.info(f"Mirror deleted {len(deleted)} objects from {bucket}, {len(failed)} failed")
+    return result
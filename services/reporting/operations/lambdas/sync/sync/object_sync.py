@@ -1,12 +1,34 @@
 import json
 import os
-import boto3
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from .clients import get_s3_client, get_bucket_client
+from .coalesce import coalesce_jobs, is_recently_copied, remember_copy, prune_recent_copies
+from .s3_copy import server_side_copy, is_precondition_failed
+from .checksums import source_etag_tagging
+from .throttle import AdaptiveLimiter
+from .metrics import SyncMetrics, top_level_prefix
+from .full_sync import list_pages
+from .mirror import delete_keys
+from .cur import (
+    CUR_MANIFESTS, find_superseded_keys, get_period_prefix, get_report_keys, is_assembly_manifest, is_report_file,
+    is_report_manifest, load_report_manifest
+)
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Number of SQS records copied in parallel within one batch
+DEFAULT_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY', '16'))
+
+# Copies are not started once less invocation time than this is left; their messages are retried
+MIN_REMAINING_TIME_MS = int(os.environ.get('SYNC_MIN_COPY_TIME_MS', '10000'))
+
+# Optional additional checksum (e.g. CRC32C, SHA256) S3 computes for each copy as an integrity check
+CHECKSUM_ALGORITHM = os.environ.get('SYNC_CHECKSUM_ALGORITHM') or None
+
 def get_object_size(s3_client, bucket, key):
     try:
         response = s3_client.head_object(Bucket=bucket, Key=key)
@@ -15,60 +37,225 @@ def get_object_size(s3_client, bucket, key):
         logger.error(f"Error getting object size for {bucket}/{key}: {str(e)}")
         return None
 
-def handler(event, _):
+def parse_record(record):
+    """
+    Extract the S3 object details from an SQS record wrapping an SNS notification
+    of an EventBridge "Object Created" event.
+    """
+    body = json.loads(record['body'])
+    logger.info("SQS message body: %s", json.dumps(body))
+
+    message = json.loads(body['Message'])
+    logger.info("Parsed message: %s", json.dumps(message))
+
+    detail_object = message['detail']['object']
+    return {
+        'region': message['region'],
+        'bucket': message['detail']['bucket']['name'],
+        'key': detail_object['key'],
+        'size': detail_object.get('size'),
+        'etag': detail_object.get('etag'),
+        'sequencer': detail_object.get('sequencer'),
+        'eventTime': message.get('time')
+    }
+
+def verify_copy(s3_client, destination_bucket, key, expected_size, expected_etag, copy_result):
+    """
+    Verify a copy from the CopyObject response where possible: an S3-computed checksum or an
+    ETag matching the source. Only ambiguous responses (e.g. multipart or KMS ETags) fall back
+    to a HEAD of the destination. Returns the verification method used; raises on a size mismatch.
+    """
+    if CHECKSUM_ALGORITHM and copy_result.get(f'Checksum{CHECKSUM_ALGORITHM}'):
+        logger.info(f"Copy verified by {CHECKSUM_ALGORITHM} checksum {copy_result[f'Checksum{CHECKSUM_ALGORITHM}']}")
+        return 'checksum'
+
+    copied_etag = (copy_result.get('ETag') or '').strip('"')
+    if expected_etag and copied_etag == expected_etag.strip('"'):
+        logger.info(f"Copy verified by matching ETag {copied_etag}")
+        return 'etag'
+
+    # Verify the copy by checking the destination object size
+    dest_size = get_object_size(s3_client, destination_bucket, key)
+    if dest_size is not None:
+        logger.info(f"Destination object size: {dest_size} bytes")
+
+        if expected_size == dest_size:
+            logger.info("Copy operation successful: Source and destination sizes match")
+        elif expected_size is not None:
+            raise ValueError(f"Size mismatch after copy of {key}: source {expected_size}, destination {dest_size} bytes")
+    return 'head'
+
+def sync_object(region, source_bucket, source_key, destination_bucket, source_size=None, source_etag=None,
+                limiter=None, out_of_time=None):
+    """
+    Copy a single object to the destination bucket and verify the copy.
+    The copy goes through the destination bucket's regional endpoint, within the limiter's
+    concurrency limit when one is given. Raises on copy failure, and raises TimeoutError instead of
+    starting the copy when the out_of_time callable returns True.
+    """
+    s3_client = get_s3_client(region)
+    dest_client = get_bucket_client(destination_bucket, region)
+
+    logger.info(f"Source: {source_bucket}/{source_key}")
+    logger.info(f"Destination: {destination_bucket}/{source_key}")
+
+    # The notification carries the object size; only HEAD the source when it is missing
+    if source_size is None:
+        source_size = get_object_size(s3_client, source_bucket, source_key)
+    if source_size is not None:
+        logger.info(f"Source object size: {source_size} bytes")
+
+    # Perform the copy operation (multipart for large objects), only while the source is still this version
+    def copy():
+        if out_of_time and out_of_time():
+            raise TimeoutError("Not enough invocation time left to start the copy")
+        return server_side_copy(dest_client, source_bucket, destination_bucket, source_key, source_size,
+                                CHECKSUM_ALGORITHM, source_etag, source_etag_tagging(source_etag))
+    copy_result = limiter.run(copy) if limiter else copy()
+
+    verify_copy(dest_client, destination_bucket, source_key, source_size, source_etag, copy_result)
+
+def sync_report_manifest(region, source_bucket, manifest_key, destination_bucket, manifest_etag=None, limiter=None,
+                         out_of_time=None):
+    """
+    Copy the report files listed in a CUR manifest as one concurrent batch, then the manifest itself,
+    and remove files of superseded assemblies from the billing period in the destination. Nothing
+    is removed unless every listed file was copied. Raises on copy failure.
+    """
+    s3_client = get_s3_client(region)
+    dest_client = get_bucket_client(destination_bucket, region)
+
+    report_keys = get_report_keys(load_report_manifest(s3_client, source_bucket, manifest_key))
+    if not report_keys or is_assembly_manifest(manifest_key, report_keys):
+        sync_object(region, source_bucket, manifest_key, destination_bucket, source_etag=manifest_etag, limiter=limiter,
+                    out_of_time=out_of_time)
+        return
+
+    logger.info(f"Copying {len(report_keys)} report files listed in {source_bucket}/{manifest_key}")
+    with ThreadPoolExecutor(max_workers=min(DEFAULT_CONCURRENCY, len(report_keys))) as executor:
+        list(executor.map(
+            lambda key: sync_object(region, source_bucket, key, destination_bucket, limiter=limiter,
+                                    out_of_time=out_of_time),
+            report_keys
+        ))
+    sync_object(region, source_bucket, manifest_key, destination_bucket, source_etag=manifest_etag, limiter=limiter,
+                out_of_time=out_of_time)
+
+    period_prefix = get_period_prefix(report_keys[0])
+    destination_keys = [
+        obj['Key']
+        for page in list_pages(dest_client, destination_bucket, period_prefix)
+        for obj in page.get('Contents', [])
+    ]
+    superseded = find_superseded_keys(destination_keys, report_keys, manifest_key)
+    if superseded:
+        deleted, failed = delete_keys(dest_client, destination_bucket, superseded)
+        logger.info(f"Removed {len(deleted)} superseded report files under {period_prefix}, {len(failed)} failed")
+
+def handler(event, context):
+    """
+    Copy every object referenced by an SQS batch, running the copies concurrently.
+    Notifications are coalesced per bucket/key so only the latest version is copied; superseded
+    notifications are acknowledged without work. In CUR manifest mode a manifest notification copies
+    its whole assembly and notifications for report files are acknowledged. Failed messages are
+    returned in 'batchItemFailures' so only those are retried. Copies that cannot start while
+    enough invocation time is left are reported as failed too, instead of the batch timing out.
+    """
     logger.info("Event received: %s", json.dumps(event))
-    logger.info("Destination bucket: %s", os.environ.get('DESTINATION_BUCKET'))
+    destination_bucket = os.environ.get('DESTINATION_BUCKET')
+    logger.info("Destination bucket: %s", destination_bucket)
+
+    records = event.get('Records', [])
+    failures = []
+    errors = []
+
+    jobs = []
+    for record in records:
+        try:
+            jobs.append((record, parse_record(record)))
+        except Exception as e:
+            logger.error(f"Error parsing SQS message {record.get('messageId')}: {str(e)}")
+            failures.append({'itemIdentifier': record.get('messageId')})
+            errors.append(str(e))
+
+    # Drop notifications superseded within the batch or already copied within the coalescing window
+    prune_recent_copies()
+    jobs, superseded = coalesce_jobs(jobs)
+    recent = [is_recently_copied(target) for _, target in jobs]
+    duplicates = [record for (record, _), is_recent in zip(jobs, recent) if is_recent]
+    jobs = [job for job, is_recent in zip(jobs, recent) if not is_recent]
+    if superseded or duplicates:
+        logger.info(f"Coalesced notifications: {len(superseded)} superseded, {len(duplicates)} recently copied")
     
-    try:
-        # Get the message from SQS message
-        body = json.loads(event['Records'][0]['body'])
-        logger.info("SQS message body: %s", json.dumps(body))
-        
-        message = json.loads(body['Message'])
-        logger.info("Parsed message: %s", json.dumps(message))
-
-        region = message['region']
-        s3_client = boto3.client('s3', region_name=region)
-        source_bucket = message['detail']['bucket']['name']
-        source_key = message['detail']['object']['key']
-        destination_bucket = os.environ.get('DESTINATION_BUCKET')
-        
-        logger.info(f"Source: {source_bucket}/{source_key}")
-        logger.info(f"Destination: {destination_bucket}/{source_key}")
+    # In CUR manifest mode report files are copied by their manifest, not by their own notifications
+    if CUR_MANIFESTS:
+        report_files = [record for record, target in jobs if is_report_file(target['key'])]
+        jobs = [(record, target) for record, target in jobs if not is_report_file(target['key'])]
+        if report_files:
+            logger.info(f"Leaving {len(report_files)} report file notifications to their manifest")
 
-        # Get source object size
-        source_size = get_object_size(s3_client, source_bucket, source_key)
-        if source_size is not None:
-            logger.info(f"Source object size: {source_size} bytes")
+    if jobs:
+        # Copies are grouped by source bucket and top-level prefix, the unit S3 scales request rates
+        # by; each group has its own adaptive limiter and metrics. A manifest job fans out into its
+        # report files, so it counts as a full concurrent batch when sizing its group's limiter
+        groups = [(target['bucket'], top_level_prefix(target['key'])) for _, target in jobs]
+        sizes = {}
+        for (_, target), group in zip(jobs, groups):
+            is_manifest = CUR_MANIFESTS and is_report_manifest(target['key'])
+            sizes[group] = sizes.get(group, 0) + (DEFAULT_CONCURRENCY if is_manifest else 1)
+        limiters = {group: AdaptiveLimiter(min(DEFAULT_CONCURRENCY, size), size) for group, size in sizes.items()}
+        # API calls are counted process-wide, so only the first group reports them
+        metrics = {group: SyncMetrics('object_sync', *group, count_api_calls=number == 0)
+                   for number, group in enumerate(sizes)}
         
-        # Perform the copy operation
-        s3_client.copy_object(
-            Bucket=destination_bucket,
-            CopySource={
-                'Bucket': source_bucket,
-                'Key': source_key
-            },
-            Key=source_key
-        )
+        def out_of_time():
+            return context is not None and context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS
         
-        # Verify the copy by checking the destination object size
-        dest_size = get_object_size(s3_client, destination_bucket, source_key)
-        if dest_size is not None:
-            logger.info(f"Destination object size: {dest_size} bytes")
-            
-            if source_size == dest_size:
-                logger.info("Copy operation successful: Source and destination sizes match")
+        def sync_and_measure(target, group):
+            started = time.monotonic()
+            if CUR_MANIFESTS and is_report_manifest(target['key']):
+                sync_report_manifest(target['region'], target['bucket'], target['key'], destination_bucket,
+                                     target['etag'], limiters[group], out_of_time)
             else:
-                logger.warning("Copy operation might have issues: Source and destination sizes do not match")
+                sync_object(target['region'], target['bucket'], target['key'], destination_bucket,
+                            target['size'], target['etag'], limiters[group], out_of_time)
+            metrics[group].record_copy((time.monotonic() - started) * 1000, target['size'], target['eventTime'])
         
-        return {
-            'statusCode': 200,
-            'body': json.dumps('S3 copy operation completed successfully')
-        }
-    
-    except Exception as e:
-        logger.error(f"Error in S3 copy operation: {str(e)}")
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(sync_and_measure, target, group) for (_, target), group in zip(jobs, groups)]
+            for (record, target), group, future in zip(jobs, groups, futures):
+                try:
+                    future.result()
+                    remember_copy(target)
+                except Exception as e:
+                    if is_precondition_failed(e):
+                        # The source was rewritten after this notification; the newer notification copies it
+                        logger.info(f"Skipping superseded version of {target['bucket']}/{target['key']}")
+                        continue
+                    if isinstance(e, TimeoutError):
+                        logger.info(f"Leaving message {record.get('messageId')} to a retry: {str(e)}")
+                        failures.append({'itemIdentifier': record.get('messageId')})
+                        errors.append(str(e))
+                        continue
+                    logger.error(f"Error in S3 copy operation for message {record.get('messageId')}: {str(e)}")
+                    metrics[group].record_failure()
+                    failures.append({'itemIdentifier': record.get('messageId')})
+                    errors.append(str(e))
+        
+        for group, group_metrics in metrics.items():
+            group_metrics.record_throttles(limiters[group].statistics()['throttledRequests'])
+            group_metrics.emit()
+
+    if failures:
+        message = f'Error in S3 copy operation: {len(failures)} of {len(records)} messages failed ({errors[0]})'
         return {
             'statusCode': 500,
-            'body': json.dumps(f'Error in S3 copy operation: {str(e)}')
-        }
\ No newline at end of file
+            'body': json.dumps(message),
+            'batchItemFailures': failures
+        }
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps('S3 copy operation completed successfully'),
+        'batchItemFailures': []
+    }
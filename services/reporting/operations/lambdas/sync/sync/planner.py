@@ -0,0 +1,138 @@
+import json
+import os
+import logging
+from .clients import get_s3_client, get_bucket_client
+from .full_sync import (
+    MANIFEST_NAME, WATERMARK_NAME, build_destination_index, compare_objects, get_concurrency, get_sync_state_key,
+    list_pages
+)
+from .manifest import load_manifest
+from .mirror import find_stale_keys
+from .watermark import WatermarkTracker, load_watermark, parse_timestamp
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Throughput model used for duration estimates: fixed per-object request latency plus
+# server-side copy bandwidth, both per worker
+OBJECT_LATENCY_MS = float(os.environ.get('SYNC_PLAN_OBJECT_LATENCY_MS', '60'))
+BYTES_PER_SECOND = float(os.environ.get('SYNC_PLAN_BYTES_PER_SECOND', str(100 * 1024 * 1024)))
+
+# Worker counts an estimate is given for, in addition to the requested concurrency
+ESTIMATE_CONCURRENCY_LEVELS = (1, 4, 16, 64)
+
+CATEGORIES = ('new', 'changed', 'identical', 'beforeWatermark', 'wouldDelete')
+
+def estimate_seconds(objects, total_bytes, concurrency):
+    """
+    Estimate the wall-clock time to copy the given objects and bytes with a number of workers.
+    """
+    worker_seconds = objects * OBJECT_LATENCY_MS / 1000 + total_bytes / BYTES_PER_SECOND
+    return round(worker_seconds / concurrency, 1)
+
+def handler(event, _):
+    """
+    Plan a full_sync without copying: list and diff the source against the destination and report
+    object counts and bytes per category with a duration estimate. The 'manifest', 'refreshManifest',
+    'since' and 'watermark' settings are applied as the same full_sync event would apply them.
+    """
+    logger.info("Event received: %s", json.dumps(event))
+
+    try:
+        source_bucket = event.get('sourceBucket')
+        destination_bucket = os.environ.get('DESTINATION_BUCKET')
+        prefix = event.get('prefix', '')
+        delimiter = event.get('delimiter')
+
+        if not source_bucket:
+            raise ValueError("Source bucket not specified in event")
+
+        source_region = event.get('region')
+        if not source_region:
+            raise ValueError("Region not specified in event")
+
+        concurrency = get_concurrency(event)
+        sample_size = int(event.get('sampleSize', 0))
+
+        s3_client = get_s3_client(source_region)
+        dest_client = get_bucket_client(destination_bucket, os.environ.get('AWS_REGION', source_region))
+
+        manifest_key = get_sync_state_key(source_bucket, prefix, delimiter, MANIFEST_NAME)
+        destination_index = None
+        if event.get('manifest') and not event.get('refreshManifest'):
+            destination_index = load_manifest(dest_client, destination_bucket, manifest_key)
+        if destination_index is None:
+            destination_index = build_destination_index(dest_client, destination_bucket, prefix, delimiter)
+
+        # Objects modified before the watermark are skipped by the run without being compared
+        threshold = parse_timestamp(event.get('since'))
+        if threshold is None and event.get('watermark'):
+            watermark_key = get_sync_state_key(source_bucket, prefix, delimiter, WATERMARK_NAME)
+            threshold = load_watermark(dest_client, destination_bucket, watermark_key)
+        watermark = WatermarkTracker(threshold)
+
+        plan = {category: {'objects': 0, 'bytes': 0} for category in CATEGORIES}
+        samples = {category: [] for category in CATEGORIES}
+        source_keys = set()
+
+        def record(category, key, size):
+            plan[category]['objects'] += 1
+            plan[category]['bytes'] += size or 0
+            if len(samples[category]) < sample_size:
+                samples[category].append(key)
+
+        for page in list_pages(s3_client, source_bucket, prefix, delimiter=delimiter):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                source_keys.add(key)
+                if key.endswith('/'):
+                    continue
+                if watermark.is_before(obj):
+                    record('beforeWatermark', key, obj.get('Size'))
+                elif key not in destination_index:
+                    record('new', key, obj.get('Size'))
+                elif compare_objects(obj, destination_index):
+                    record('changed', key, obj.get('Size'))
+                else:
+                    record('identical', key, obj.get('Size'))
+
+        for key in find_stale_keys(destination_index, source_keys):
+            record('wouldDelete', key, destination_index[key].get('Size'))
+
+        copy_objects = plan['new']['objects'] + plan['changed']['objects']
+        copy_bytes = plan['new']['bytes'] + plan['changed']['bytes']
+        levels = sorted(set(ESTIMATE_CONCURRENCY_LEVELS) | {concurrency})
+        estimate = {
+            'copyObjects': copy_objects,
+            'copyBytes': copy_bytes,
+            'concurrency': concurrency,
+            'estimatedSeconds': estimate_seconds(copy_objects, copy_bytes, concurrency),
+            'estimatedSecondsByConcurrency': {
+                str(level): estimate_seconds(copy_objects, copy_bytes, level) for level in levels
+            }
+        }
+
+        logger.info(f"Sync plan: {copy_objects} objects ({copy_bytes} bytes) to copy, " +
+                    f"{plan['wouldDelete']['objects']} would be deleted, " +
+                    f"estimated {estimate['estimatedSeconds']}s with {concurrency} workers")
+
+        body = {
+            'message': 'S3 sync plan completed',
+            'plan': plan,
+            'estimate': estimate
+        }
+        if sample_size:
+            body['samples'] = samples
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(body)
+        }
+
+    except Exception as e:
+        logger.error(f"Error in S3 sync plan: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error in S3 sync plan: {str(e)}')
+        }
@@ -0,0 +1,153 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MIB = 1024 * 1024
+
+# Objects at or above this size are copied with multipart UploadPartCopy
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD_BYTES', str(512 * MIB)))
+
+# Size of each copied part, and how many parts are copied in parallel per object
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE_BYTES', str(128 * MIB)))
+MULTIPART_CONCURRENCY = int(os.environ.get('MULTIPART_CONCURRENCY', '8'))
+
+# S3 limits for multipart uploads
+MIN_PART_SIZE = 5 * MIB
+MAX_PARTS = 10000
+
+def get_part_ranges(size, part_size=None):
+    """
+    Split an object of the given size into inclusive (start, end) byte ranges.
+    The part size is raised when needed to stay within the S3 part count limit.
+    """
+    part_size = max(part_size or MULTIPART_PART_SIZE, MIN_PART_SIZE)
+    if size > part_size * MAX_PARTS:
+        part_size = -(-size // MAX_PARTS)
+
+    ranges = []
+    start = 0
+    while start < size:
+        end = min(start + part_size, size) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+def get_copy_source_args(source_etag):
+    """
+    Make the copy conditional on the source still having the given ETag, so a copy triggered
+    by a notification for a superseded version fails fast instead of copying again.
+    """
+    if not source_etag:
+        return {}
+    etag = source_etag.strip('"')
+    return {'CopySourceIfMatch': f'"{etag}"'}
+
+# Object settings CopyObject carries over by default (MetadataDirective=COPY) but CreateMultipartUpload
+# only sets when given; the source KMS key is left out as it may belong to another account
+COPIED_ATTRIBUTES = (
+    'ContentType', 'ContentEncoding', 'ContentDisposition', 'ContentLanguage', 'CacheControl', 'Expires',
+    'Metadata', 'ServerSideEncryption', 'BucketKeyEnabled'
+)
+
+def get_source_attributes(s3_client, source_bucket, key, source_etag=None):
+    """
+    Read the content headers, user metadata and encryption setting of the source object, in the
+    form CreateMultipartUpload accepts them.
+    """
+    response = s3_client.head_object(Bucket=source_bucket, Key=key, **get_head_args(source_etag))
+    return {name: response[name] for name in COPIED_ATTRIBUTES if response.get(name) is not None}
+
+def get_head_args(source_etag):
+    if not source_etag:
+        return {}
+    return {'IfMatch': get_copy_source_args(source_etag)['CopySourceIfMatch']}
+
+def is_precondition_failed(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in ('PreconditionFailed', '412')
+
+def multipart_copy(s3_client, source_bucket, destination_bucket, key, size, part_size=None, concurrency=None,
+                   checksum_algorithm=None, source_etag=None, tagging=None):
+    """
+    Copy an object server-side with UploadPartCopy, copying parts in parallel. The copy keeps the
+    content headers, user metadata and encryption setting of the source, like CopyObject does.
+    The upload is aborted if any part fails, so no incomplete uploads are left behind.
+    Returns the CompleteMultipartUpload response.
+    """
+    part_ranges = get_part_ranges(size, part_size)
+    logger.info(f"Multipart copy of {source_bucket}/{key} ({size} bytes) in {len(part_ranges)} parts")
+
+    extra_args = get_source_attributes(s3_client, source_bucket, key, source_etag)
+    if checksum_algorithm:
+        extra_args['ChecksumAlgorithm'] = checksum_algorithm
+    if tagging:
+        extra_args['Tagging'] = tagging
+    upload_id = s3_client.create_multipart_upload(Bucket=destination_bucket, Key=key, **extra_args)['UploadId']
+
+    def copy_part(part):
+        part_number, (start, end) = part
+        response = s3_client.upload_part_copy(
+            Bucket=destination_bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            CopySource={
+                'Bucket': source_bucket,
+                'Key': key
+            },
+            CopySourceRange=f'bytes={start}-{end}',
+            **get_copy_source_args(source_etag)
+        )
+        part = {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+        if checksum_algorithm:
+            part[f'Checksum{checksum_algorithm}'] = response['CopyPartResult'].get(f'Checksum{checksum_algorithm}')
+        return part
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency or MULTIPART_CONCURRENCY) as executor:
+            parts = list(executor.map(copy_part, enumerate(part_ranges, start=1)))
+
+        return s3_client.complete_multipart_upload(
+            Bucket=destination_bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        logger.error(f"Aborting multipart copy of {key} (upload {upload_id})")
+        s3_client.abort_multipart_upload(Bucket=destination_bucket, Key=key, UploadId=upload_id)
+        raise
+
+def server_side_copy(s3_client, source_bucket, destination_bucket, key, size=None, checksum_algorithm=None,
+                     source_etag=None, tagging=None):
+    """
+    Copy an object between buckets, switching to multipart copy for large objects.
+    When the size is unknown a single CopyObject request is used. With a source ETag the copy
+    only succeeds if the source is still that version. Tagging replaces the tags of the copy.
+    Returns the ETag and any checksum S3 reported for the new object.
+    """
+    if size is not None and size >= MULTIPART_THRESHOLD:
+        response = multipart_copy(s3_client, source_bucket, destination_bucket, key, size,
+                                  checksum_algorithm=checksum_algorithm, source_etag=source_etag, tagging=tagging)
+        return {name: value for name, value in response.items() if name == 'ETag' or name.startswith('Checksum')}
+
+    extra_args = get_copy_source_args(source_etag)
+    if checksum_algorithm:
+        extra_args['ChecksumAlgorithm'] = checksum_algorithm
+    if tagging:
+        extra_args['Tagging'] = tagging
+        extra_args['TaggingDirective'] = 'REPLACE'
+    response = s3_client.copy_object(
+        Bucket=destination_bucket,
+        CopySource={
+            'Bucket': source_bucket,
+            'Key': key
+        },
+        Key=key,
+        **extra_args
+    )
+    return response.get('CopyObjectResult', {})
@@ -0,0 +1,50 @@
+import gzip
+import json
+import os
+import logging
+from urllib.parse import quote
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Sync state objects live under this prefix in the destination bucket
+STATE_PREFIX = os.environ.get('SYNC_STATE_PREFIX', '.sync-state/')
+
+def get_state_key(source_bucket, prefix, name):
+    """
+    Build the destination key of a state object for a source bucket and prefix.
+    """
+    return f"{STATE_PREFIX}{source_bucket}/{quote(prefix, safe='') or '_'}/{name}"
+
+def is_state_key(key):
+    return key.startswith(STATE_PREFIX)
+
+def load_state(s3_client, bucket, key, compressed=False):
+    """
+    Load a JSON state object, optionally gzip compressed, returning None if it does not exist.
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+    body = response['Body'].read()
+    if compressed:
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+def save_state(s3_client, bucket, key, state, compressed=False):
+    body = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    extra_args = {'ContentType': 'application/json'}
+    if compressed:
+        body = gzip.compress(body)
+        extra_args['ContentEncoding'] = 'gzip'
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+    logger.info(f"Saved sync state to {bucket}/{key}")
+
+def delete_state(s3_client, bucket, key):
+    s3_client.delete_object(Bucket=bucket, Key=key)
+    logger.info(f"Removed sync state {bucket}/{key}")
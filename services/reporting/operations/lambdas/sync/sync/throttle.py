@@ -0,0 +1,110 @@
+import os
+import time
+import random
+import logging
+import threading
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Upper bound for in-flight copies the controller may grow to, overridable per event with 'maxConcurrency'
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get('SYNC_MAX_CONCURRENCY', '64'))
+
+# Multiplicative decrease applied on throttling, at most once per cooldown period
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+# Per-key retry budget and full-jitter backoff bounds for throttled requests
+MAX_ATTEMPTS = int(os.environ.get('SYNC_THROTTLE_MAX_ATTEMPTS', '6'))
+BASE_DELAY_SECONDS = 0.2
+MAX_DELAY_SECONDS = 10.0
+
+THROTTLE_CODES = ('SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException')
+SERVER_ERROR_CODES = ('InternalError', 'ServiceUnavailable')
+
+def is_throttle_error(error):
+    if not isinstance(error, ClientError):
+        return False
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return error.response.get('Error', {}).get('Code') in THROTTLE_CODES or status == 503
+
+def is_server_error(error):
+    if not isinstance(error, ClientError):
+        return False
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return error.response.get('Error', {}).get('Code') in SERVER_ERROR_CODES or status >= 500
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff for the given (zero based) attempt.
+    """
+    return random.uniform(0, min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** attempt))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD controller for the number of in-flight S3 requests. Each success raises the limit by
+    roughly one per window of 'limit' completions; throttling and server errors halve it, and
+    other failures leave it unchanged. Throttled requests are retried per key with jittered backoff.
+    """
+
+    def __init__(self, initial, maximum=None, minimum=1):
+        self.maximum = max(maximum or DEFAULT_MAX_CONCURRENCY, initial)
+        self.minimum = minimum
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.throttled_requests = 0
+        self.server_errors = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False, server_error=False, failed=False):
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled or server_error:
+                if throttled:
+                    self.throttled_requests += 1
+                else:
+                    self.server_errors += 1
+                if now - self.last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self.last_decrease = now
+                    logger.info(f"{'Throttled' if throttled else 'Server error'}, " +
+                                f"reducing concurrency limit to {int(self.limit)}")
+            elif not failed:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def run(self, operation):
+        """
+        Run an S3 operation within the concurrency limit, retrying it with backoff when throttled.
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            self.acquire()
+            try:
+                result = operation()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.release(throttled=throttled, server_error=not throttled and is_server_error(e), failed=True)
+                if throttled and attempt < MAX_ATTEMPTS - 1:
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                raise
+            self.release()
+            return result
+
+    def statistics(self):
+        return {
+            'concurrencyLimit': int(self.limit),
+            'throttledRequests': self.throttled_requests,
+            'serverErrors': self.server_errors
+        }
@@ -0,0 +1,76 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from .state import load_state, save_state
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# The stored watermark is held back by this margin: S3 sets LastModified of a multipart upload to
+# when the upload started, so an object completed after a run can carry an older timestamp
+WATERMARK_OVERLAP_SECONDS = int(os.environ.get('SYNC_WATERMARK_OVERLAP_SECONDS', '3600'))
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 timestamp (datetimes pass through), assuming UTC when no offset is given.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def format_timestamp(value):
+    return value.isoformat() if value else None
+
+def load_watermark(s3_client, bucket, key):
+    state = load_state(s3_client, bucket, key)
+    return parse_timestamp(state['watermark']) if state else None
+
+def save_watermark(s3_client, bucket, key, watermark):
+    save_state(s3_client, bucket, key, {'watermark': format_timestamp(watermark)})
+
+
+class WatermarkTracker:
+    """
+    Tracks the source LastModified range of a full_sync run. Objects modified before the
+    threshold are skipped; the next watermark is the newest LastModified seen, held back to
+    the oldest failed object so failures are retried on the next run, minus the overlap margin.
+    """
+
+    def __init__(self, threshold=None, progress=None):
+        progress = progress or {}
+        self.threshold = threshold
+        self.max_seen = parse_timestamp(progress.get('maxLastModified'))
+        self.min_failed = parse_timestamp(progress.get('minFailedLastModified'))
+
+    def is_before(self, source_object):
+        last_modified = parse_timestamp(source_object.get('LastModified'))
+        return bool(self.threshold and last_modified and last_modified < self.threshold)
+
+    def observe(self, source_object):
+        last_modified = parse_timestamp(source_object.get('LastModified'))
+        if last_modified and (self.max_seen is None or last_modified > self.max_seen):
+            self.max_seen = last_modified
+
+    def failed(self, source_object):
+        last_modified = parse_timestamp(source_object.get('LastModified'))
+        if last_modified and (self.min_failed is None or last_modified < self.min_failed):
+            self.min_failed = last_modified
+
+    def progress(self):
+        return {
+            'maxLastModified': format_timestamp(self.max_seen),
+            'minFailedLastModified': format_timestamp(self.min_failed)
+        }
+
+    def next_watermark(self):
+        if self.max_seen is None:
+            return self.threshold
+        watermark = self.max_seen
+        if self.min_failed is not None:
+            watermark = min(watermark, self.min_failed)
+        return watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
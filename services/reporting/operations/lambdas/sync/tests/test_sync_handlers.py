@@ -1,13 +1,32 @@
+import io
+import gzip
 import json
+import time
+import threading
+from types import SimpleNamespace
 import pytest
 from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
 from sync.index import handler
-from sync.object_sync import handler as object_sync_handler
-from sync.full_sync import handler as full_sync_handler
+from sync.object_sync import handler as object_sync_handler, verify_copy
+from sync.full_sync import handler as full_sync_handler, prefetch_pages
+from sync.coordinator import handler as coordinator_handler, discover_shards
+from sync.clients import reset_clients, get_s3_client, get_bucket_client
+from sync.coalesce import reset_recent_copies
+from sync.dispatch import LocalDispatcher, start_shard
+from sync.manifest import load_manifest, save_manifest
+from sync.mirror import mirror_destination
+from sync.throttle import AdaptiveLimiter
+from sync.inventory import iter_inventory_file, inventory_pages
+from sync.cur import find_superseded_keys
+from sync.metrics import SyncMetrics, record_api_call, percentile
+from datetime import datetime, timedelta, timezone
+from sync.s3_copy import get_part_ranges, server_side_copy, MIB
 
 # Mock S3 event for object sync
 MOCK_OBJECT_SYNC_EVENT = {
     'Records': [{
+        'messageId': 'message-1',
         'body': json.dumps({
             'Message': json.dumps({
                 'region': 'us-east-1',
@@ -34,10 +53,15 @@ MOCK_FULL_SYNC_EVENT = {
 
 @pytest.fixture
 def mock_s3_client():
+    reset_clients()
+    reset_recent_copies()
     with patch('boto3.client') as mock_client:
         # Configure the mock client
         mock_s3 = MagicMock()
         mock_client.return_value = mock_s3
+        mock_s3.head_bucket.return_value = {
+            'ResponseMetadata': {'HTTPHeaders': {'x-amz-bucket-region': 'eu-west-1'}}
+        }
         
         # Mock head_object responses
         def head_object_side_effect(**kwargs):
@@ -57,15 +81,72 @@ def mock_s3_client():
         # Mock copy_object
         mock_s3.copy_object.return_value = {}
         
-        # Mock list_objects_v2 for full sync
-        mock_s3.get_paginator.return_value.paginate.return_value = [{
-            'Contents': [
-                {'Key': 'test/file1.txt'},
-                {'Key': 'test/file2.txt'}
-            ]
-        }]
+        # Mock list_objects_v2 for full sync, one listing per bucket
+        mock_s3.listings = {
+            'source-bucket': [{
+                'Contents': [
+                    {'Key': 'test/file1.txt', 'ETag': '"123456789"', 'Size': 1000},
+                    {'Key': 'test/file2.txt', 'ETag': '"123456789"', 'Size': 1000}
+                ]
+            }],
+            'dest-bucket': [{}]
+        }
+        
+        def list_objects_v2_side_effect(**kwargs):
+            pages = mock_s3.listings[kwargs['Bucket']]
+            index = int(kwargs.get('ContinuationToken', 0))
+            page = dict(pages[index])
+            if 'StartAfter' in kwargs:
+                # Move to the first page with keys after StartAfter and drop the keys before it
+                while index + 1 < len(pages) and all(obj['Key'] <= kwargs['StartAfter']
+                                                     for obj in pages[index].get('Contents', [])):
+                    index += 1
+                page = dict(pages[index])
+                page['Contents'] = [obj for obj in page.get('Contents', []) if obj['Key'] > kwargs['StartAfter']]
+            if 'Delimiter' in kwargs:
+                contents, common_prefixes = [], []
+                for obj in page.get('Contents', []):
+                    if not obj['Key'].startswith(kwargs['Prefix']):
+                        continue
+                    rest = obj['Key'][len(kwargs['Prefix']):]
+                    if kwargs['Delimiter'] in rest:
+                        common = kwargs['Prefix'] + rest.split(kwargs['Delimiter'])[0] + kwargs['Delimiter']
+                        if {'Prefix': common} not in common_prefixes:
+                            common_prefixes.append({'Prefix': common})
+                    else:
+                        contents.append(obj)
+                page = {'Contents': contents, 'CommonPrefixes': common_prefixes}
+            elif 'Prefix' in kwargs:
+                page['Contents'] = [obj for obj in page.get('Contents', []) if obj['Key'].startswith(kwargs['Prefix'])]
+            if index + 1 < len(pages):
+                page['IsTruncated'] = True
+                page['NextContinuationToken'] = str(index + 1)
+            return page
+        
+        mock_s3.list_objects_v2.side_effect = list_objects_v2_side_effect
+        
+        # Mock state objects stored in the destination bucket
+        mock_s3.objects = {}
+        
+        def get_object_side_effect(**kwargs):
+            if kwargs['Key'] not in mock_s3.objects:
+                raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+            return {'Body': io.BytesIO(mock_s3.objects[kwargs['Key']])}
+        
+        def put_object_side_effect(**kwargs):
+            mock_s3.objects[kwargs['Key']] = kwargs['Body']
+            return {}
+        
+        def delete_object_side_effect(**kwargs):
+            mock_s3.objects.pop(kwargs['Key'], None)
+            return {}
+        
+        mock_s3.get_object.side_effect = get_object_side_effect
+        mock_s3.put_object.side_effect = put_object_side_effect
+        mock_s3.delete_object.side_effect = delete_object_side_effect
         
         yield mock_s3
+    reset_clients()
 
 def test_object_sync_handler(mock_s3_client):
     """Test the object sync handler with a mock S3 event"""
@@ -121,12 +202,13 @@ def test_error_handling(mock_s3_client):
         response = object_sync_handler(MOCK_OBJECT_SYNC_EVENT, None)
         assert response['statusCode'] == 500
         assert 'Error in S3 copy operation' in response['body']
+        assert response['batchItemFailures'] == [{'itemIdentifier': 'message-1'}]
         
         # Reset the side effect for full_sync test
         mock_s3_client.copy_object.side_effect = None
         
         # Simulate error in full_sync by causing an exception in list_objects_v2
-        mock_s3_client.get_paginator.side_effect = Exception("S3 Error")
+        mock_s3_client.list_objects_v2.side_effect = Exception("S3 Error")
         
         # Test full sync error handling
         response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
@@ -147,4 +229,1095 @@ def test_missing_region_fails(mock_s3_client):
         # Test full sync handling of missing region
         response = full_sync_handler(event_missing_region, None)
         assert response['statusCode'] == 500
-        assert 'Region not specified in event' in response['body'] 
\ No newline at end of file
+        assert 'Region not specified in event' in response['body'] 
+
+def test_full_sync_concurrent_workers(mock_s3_client):
+    """Test that full_sync runs the compare/copy work on a worker pool and keeps the statistics"""
+    mock_s3_client.listings['source-bucket'] = [{
+        'Contents': [{'Key': f'test/file{i}.txt', 'ETag': '"1"', 'Size': 1} for i in range(50)] +
+                    [{'Key': 'test/folder/'}]
+    }]
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler({**MOCK_FULL_SYNC_EVENT, 'concurrency': 8}, None)
+        
+        assert response['statusCode'] == 200
+        stats = json.loads(response['body'])['statistics']
+        assert stats['totalObjects'] == 51
+        assert stats['copiedObjects'] == 50
+        assert stats['skippedObjects'] == 1
+        assert stats['failedObjects'] == 0
+        assert mock_s3_client.copy_object.call_count == 50
+
+def test_full_sync_invalid_concurrency(mock_s3_client):
+    """Test that full_sync rejects a worker pool size below 1"""
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler({**MOCK_FULL_SYNC_EVENT, 'concurrency': 0}, None)
+        assert response['statusCode'] == 500
+        assert 'Concurrency must be at least 1' in response['body']
+
+
+def test_full_sync_diffs_against_destination_listing(mock_s3_client):
+    """Test that full_sync skips objects whose ETag and size match the destination listing without HEAD calls"""
+    mock_s3_client.listings['dest-bucket'] = [{
+        'Contents': [
+            {'Key': 'test/file1.txt', 'ETag': '"123456789"', 'Size': 1000},
+            {'Key': 'test/file2.txt', 'ETag': '"987654321"', 'Size': 1000}
+        ]
+    }]
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
+        
+        stats = json.loads(response['body'])['statistics']
+        assert stats['copiedObjects'] == 1
+        assert stats['skippedObjects'] == 1
+        mock_s3_client.head_object.assert_not_called()
+        assert mock_s3_client.copy_object.call_args[1]['Key'] == 'test/file2.txt'
+
+def test_part_ranges_cover_object():
+    """Test that multipart ranges cover the whole object and respect the part count limit"""
+    ranges = get_part_ranges(25 * MIB + 1, 10 * MIB)
+    assert ranges == [(0, 10 * MIB - 1), (10 * MIB, 20 * MIB - 1), (20 * MIB, 25 * MIB)]
+    
+    ranges = get_part_ranges(10000 * 5 * MIB + 1, 5 * MIB)
+    assert len(ranges) <= 10000
+    assert ranges[-1][1] == 10000 * 5 * MIB
+
+def test_multipart_copy_for_large_objects(mock_s3_client):
+    """Test that objects above the threshold are copied with UploadPartCopy"""
+    mock_s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+    mock_s3_client.upload_part_copy.side_effect = \
+        lambda **kwargs: {'CopyPartResult': {'ETag': '"part%d"' % kwargs['PartNumber']}}
+    mock_s3_client.head_object.side_effect = None
+    mock_s3_client.head_object.return_value = {
+        'ContentLength': 12 * MIB, 'ETag': '"big"', 'ContentType': 'application/vnd.apache.parquet',
+        'ContentEncoding': 'gzip', 'Metadata': {'report': 'cur'}, 'ServerSideEncryption': 'aws:kms',
+        'SSEKMSKeyId': 'arn:aws:kms:eu-west-1:111111111111:key/source'
+    }
+    
+    with patch('sync.s3_copy.MULTIPART_THRESHOLD', 10 * MIB), patch('sync.s3_copy.MULTIPART_PART_SIZE', 5 * MIB):
+        server_side_copy(mock_s3_client, 'source-bucket', 'dest-bucket', 'test/big.parquet', 12 * MIB,
+                         source_etag='big')
+    
+    # Content headers, metadata and encryption are carried over like CopyObject does
+    mock_s3_client.head_object.assert_called_once_with(Bucket='source-bucket', Key='test/big.parquet', IfMatch='"big"')
+    mock_s3_client.create_multipart_upload.assert_called_once_with(
+        Bucket='dest-bucket', Key='test/big.parquet', ContentType='application/vnd.apache.parquet',
+        ContentEncoding='gzip', Metadata={'report': 'cur'}, ServerSideEncryption='aws:kms'
+    )
+    mock_s3_client.copy_object.assert_not_called()
+    assert mock_s3_client.upload_part_copy.call_count == 3
+    parts = mock_s3_client.complete_multipart_upload.call_args[1]['MultipartUpload']['Parts']
+    assert [part['PartNumber'] for part in parts] == [1, 2, 3]
+    assert parts[0]['ETag'] == '"part1"'
+
+def test_multipart_copy_aborts_on_failure(mock_s3_client):
+    """Test that a failed part aborts the multipart upload"""
+    mock_s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+    mock_s3_client.upload_part_copy.side_effect = Exception("S3 Error")
+    
+    with patch('sync.s3_copy.MULTIPART_THRESHOLD', 10 * MIB):
+        with pytest.raises(Exception):
+            server_side_copy(mock_s3_client, 'source-bucket', 'dest-bucket', 'test/big.parquet', 12 * MIB)
+    
+    mock_s3_client.complete_multipart_upload.assert_not_called()
+    mock_s3_client.abort_multipart_upload.assert_called_once_with(
+        Bucket='dest-bucket', Key='test/big.parquet', UploadId='upload-1'
+    )
+
+def make_sqs_record(message_id, key, bucket='source-bucket', **object_fields):
+    """Build an SQS record wrapping an S3 Object Created notification"""
+    return {
+        'messageId': message_id,
+        'body': json.dumps({
+            'Message': json.dumps({
+                'region': 'us-east-1',
+                'detail': {
+                    'bucket': {'name': bucket},
+                    'object': {'key': key, **object_fields}
+                }
+            })
+        })
+    }
+
+def test_object_sync_processes_whole_batch(mock_s3_client):
+    """Test that every record in an SQS batch is copied"""
+    event = {'Records': [make_sqs_record(f'message-{i}', f'test/file{i}.txt') for i in range(10)]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler(event, None)
+    
+    assert response['statusCode'] == 200
+    assert response['batchItemFailures'] == []
+    copied = sorted(call[1]['Key'] for call in mock_s3_client.copy_object.call_args_list)
+    assert copied == sorted(f'test/file{i}.txt' for i in range(10))
+
+def test_object_sync_reports_partial_batch_failures(mock_s3_client):
+    """Test that only failed and malformed messages are reported for retry"""
+    def copy_object_side_effect(**kwargs):
+        if kwargs['Key'] == 'test/bad.txt':
+            raise Exception("S3 Error")
+        return {}
+    mock_s3_client.copy_object.side_effect = copy_object_side_effect
+    
+    event = {'Records': [
+        make_sqs_record('message-1', 'test/good.txt'),
+        make_sqs_record('message-2', 'test/bad.txt'),
+        {'messageId': 'message-3', 'body': 'not json'}
+    ]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler(event, None)
+    
+    failed = sorted(item['itemIdentifier'] for item in response['batchItemFailures'])
+    assert failed == ['message-2', 'message-3']
+
+def test_object_sync_leaves_copies_without_time_to_a_retry(mock_s3_client):
+    """Test that copies which cannot start before the timeout are reported failed instead of run"""
+    event = {'Records': [make_sqs_record(f'message-{i}', f'test/file{i}.txt') for i in range(3)]}
+    context = MagicMock()
+    context.get_remaining_time_in_millis.side_effect = [900000] + [1000] * 10
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler(event, context)
+    
+    assert mock_s3_client.copy_object.call_count == 1
+    copied = mock_s3_client.copy_object.call_args.kwargs['Key']
+    failed = sorted(item['itemIdentifier'] for item in response['batchItemFailures'])
+    assert failed == sorted(f'message-{i}' for i in range(3) if f'test/file{i}.txt' != copied)
+
+def test_full_sync_checkpoints_and_resumes(mock_s3_client):
+    """Test that full_sync saves a checkpoint when time runs low and resumes from it"""
+    mock_s3_client.listings['source-bucket'] = [
+        {'Contents': [{'Key': f'test/page{page}/file{i}.txt', 'ETag': '"1"', 'Size': 1} for i in range(3)]}
+        for page in range(3)
+    ]
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 1000
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, context)
+        body = json.loads(response['body'])
+        assert body['complete'] is False
+        assert body['statistics']['copiedObjects'] == 1
+        
+        # The run stops inside the page and resumes after the last finished key
+        checkpoint = json.loads(mock_s3_client.objects['.sync-state/source-bucket/test%2F/full_sync.checkpoint.json'])
+        assert checkpoint['lastKey'] == 'test/page0/file0.txt'
+        
+        # The next invocation has plenty of time and picks up where the first stopped
+        context.get_remaining_time_in_millis.return_value = 900000
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, context)
+        body = json.loads(response['body'])
+        assert body['complete'] is True
+        assert body['statistics']['totalObjects'] == 9
+        assert body['statistics']['copiedObjects'] == 9
+        assert mock_s3_client.copy_object.call_count == 9
+        assert list(mock_s3_client.objects) == []
+
+def test_full_sync_stops_taking_copies_when_time_runs_low(mock_s3_client):
+    """Test that copies not started when time runs low are cancelled and redone after the checkpoint"""
+    mock_s3_client.listings['source-bucket'] = [
+        {'Contents': [{'Key': f'test/file{i}.txt', 'ETag': '"1"', 'Size': 1} for i in range(6)]}
+    ]
+    mock_s3_client.copy_object.side_effect = lambda **kwargs: time.sleep(0.05) or {}
+    context = MagicMock()
+    context.get_remaining_time_in_millis.side_effect = [900000] * 2 + [1000] * 100
+    event = {**MOCK_FULL_SYNC_EVENT, 'concurrency': 1, 'maxConcurrency': 1}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        body = json.loads(full_sync_handler(event, context)['body'])
+        assert body['complete'] is False
+        assert body['statistics'] == {'totalObjects': 1, 'copiedObjects': 1, 'skippedObjects': 0, 'failedObjects': 0}
+        assert mock_s3_client.copy_object.call_count == 1
+        checkpoint = json.loads(mock_s3_client.objects['.sync-state/source-bucket/test%2F/full_sync.checkpoint.json'])
+        assert checkpoint['lastKey'] == 'test/file0.txt'
+        
+        context.get_remaining_time_in_millis.side_effect = None
+        context.get_remaining_time_in_millis.return_value = 900000
+        body = json.loads(full_sync_handler(event, context)['body'])
+    
+    assert body['complete'] is True
+    assert body['statistics']['totalObjects'] == 6
+    assert mock_s3_client.copy_object.call_count == 6
+
+def test_full_sync_removes_ignored_checkpoints(mock_s3_client):
+    """Test that a completed run removes a checkpoint it did not resume, so the next run starts over"""
+    checkpoint_key = '.sync-state/source-bucket/test%2F/full_sync.checkpoint.json'
+    stale_checkpoint = json.dumps({
+        'lastKey': 'test/file1.txt',
+        'continuationToken': None,
+        'statistics': {'totalObjects': 5, 'copiedObjects': 5, 'skippedObjects': 0, 'failedObjects': 0},
+        'watermarkProgress': None,
+        'sourceInventory': None,
+        'mirror': False
+    }).encode('utf-8')
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        for event in ({**MOCK_FULL_SYNC_EVENT, 'restart': True},
+                      {**MOCK_FULL_SYNC_EVENT, 'sourceInventory': put_inventory(mock_s3_client, 'source', [('test/a.csv', 1, 'a')])}):
+            mock_s3_client.objects[checkpoint_key] = stale_checkpoint
+            body = json.loads(full_sync_handler(event, None)['body'])
+            assert body['complete'] is True
+            assert checkpoint_key not in mock_s3_client.objects
+        
+        body = json.loads(full_sync_handler(MOCK_FULL_SYNC_EVENT, None)['body'])
+    
+    assert body['statistics']['totalObjects'] == 2
+    assert body['statistics']['copiedObjects'] == 2
+
+def test_discover_shards(mock_s3_client):
+    """Test that shards are discovered per sub-prefix, with a delimited shard for loose objects"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/manifest.json'},
+        {'Key': 'test/2024-01/a.parquet'},
+        {'Key': 'test/2024-02/a.parquet'},
+        {'Key': 'test/2024-02/b.parquet'}
+    ]}]
+    
+    shards = discover_shards(mock_s3_client, 'source-bucket', 'test/')
+    assert shards == [
+        {'prefix': 'test/', 'delimiter': '/'},
+        {'prefix': 'test/2024-01/'},
+        {'prefix': 'test/2024-02/'}
+    ]
+
+def test_coordinator_fans_out_and_aggregates(mock_s3_client):
+    """Test that the coordinator dispatches one worker per shard and sums their statistics"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/manifest.json', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/2024-01/a.parquet', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/2024-02/a.parquet', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/2024-02/b.parquet', 'ETag': '"1"', 'Size': 1}
+    ]}]
+    event = {**MOCK_FULL_SYNC_EVENT, 'mode': 'coordinator'}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        dispatcher = LocalDispatcher(full_sync_handler)
+        with patch.object(dispatcher, 'dispatch', wraps=dispatcher.dispatch) as dispatch:
+            response = coordinator_handler(event, None, dispatcher)
+    
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['shards'] == 3
+    assert body['complete'] is True
+    assert body['statistics']['totalObjects'] == 4
+    assert body['statistics']['copiedObjects'] == 4
+    shard_events = dispatch.call_args[0][0]
+    assert all('mode' not in shard_event for shard_event in shard_events)
+    assert sorted(call[1]['Key'] for call in mock_s3_client.copy_object.call_args_list) == [
+        'test/2024-01/a.parquet', 'test/2024-02/a.parquet', 'test/2024-02/b.parquet', 'test/manifest.json'
+    ]
+
+def test_coordinator_mirror_caps_deletes_across_shards(mock_s3_client):
+    """Test that maxDeletes holds for a coordinator mirror run as a whole, not per shard"""
+    source = [{'Key': f'test/2024-0{month}/a.parquet', 'ETag': '"1"', 'Size': 1} for month in (1, 2)]
+    mock_s3_client.listings['source-bucket'] = [{'Contents': source}]
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': sorted(
+        source + [{'Key': f'test/2024-0{month}/old.parquet', 'ETag': '"1"', 'Size': 1} for month in (1, 2)],
+        key=lambda obj: obj['Key']
+    )}]
+    mock_s3_client.delete_objects.return_value = {}
+    event = {**MOCK_FULL_SYNC_EVENT, 'mode': 'coordinator', 'mirror': True}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        # Each shard holds one stale object, within a cap of 1, but the run holds two
+        body = json.loads(coordinator_handler({**event, 'maxDeletes': 1}, None, LocalDispatcher(full_sync_handler))['body'])
+        assert body['mirror']['staleObjects'] == 2
+        assert body['mirror']['capExceeded'] is True
+        mock_s3_client.delete_objects.assert_not_called()
+        
+        body = json.loads(coordinator_handler({**event, 'maxDeletes': 2}, None, LocalDispatcher(full_sync_handler))['body'])
+    
+    assert body['complete'] is True
+    assert body['mirror']['deletedObjects'] == 2
+    deleted = sorted(call.kwargs['Delete']['Objects'][0]['Key'] for call in mock_s3_client.delete_objects.call_args_list)
+    assert deleted == ['test/2024-01/old.parquet', 'test/2024-02/old.parquet']
+
+def test_shard_budgets_are_measured_when_each_shard_starts():
+    """Test that queued shards get the time left at their start and are not started past the deadline"""
+    budgets = []
+    def run(event):
+        budgets.append(event['timeBudgetMs'])
+        time.sleep(0.2)
+        return {'statusCode': 200, 'body': json.dumps({'complete': True, 'statistics': {}})}
+    
+    with patch('sync.dispatch.MIN_SHARD_TIME_MS', 150):
+        deadline = time.monotonic() + 0.5
+        responses = [start_shard(run, {'prefix': f'test/{i}/'}, deadline) for i in range(4)]
+    
+    assert len(budgets) == 2
+    assert budgets[0] > budgets[1] >= 150
+    assert [json.loads(response['body'])['complete'] for response in responses] == [True, True, False, False]
+
+def test_coordinator_reports_shards_without_time_as_incomplete(mock_s3_client):
+    """Test that shards which cannot start before the coordinator's deadline are reported, not dispatched"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/2024-01/a.parquet', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/2024-02/a.parquet', 'ETag': '"1"', 'Size': 1}
+    ]}]
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 8000
+    event = {**MOCK_FULL_SYNC_EVENT, 'mode': 'coordinator'}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = coordinator_handler(event, context, LocalDispatcher(full_sync_handler))
+    
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['complete'] is False
+    assert body['incompleteShards'] == ['test/2024-01/', 'test/2024-02/']
+    mock_s3_client.copy_object.assert_not_called()
+
+def test_coordinator_reports_failed_shards(mock_s3_client):
+    """Test that a failing shard is reported without losing the other shards' statistics"""
+    class FakeDispatcher:
+        def dispatch(self, events, deadline=None):
+            return [
+                {'statusCode': 200, 'body': json.dumps({'complete': True, 'statistics': {'totalObjects': 2, 'copiedObjects': 2}})},
+                {'statusCode': 500, 'body': json.dumps('Error in S3 sync operation: boom')}
+            ]
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/2024-01/a.parquet'},
+        {'Key': 'test/2024-02/a.parquet'}
+    ]}]
+    
+    response = coordinator_handler({**MOCK_FULL_SYNC_EVENT, 'mode': 'coordinator'}, None, FakeDispatcher())
+    
+    assert response['statusCode'] == 500
+    body = json.loads(response['body'])
+    assert body['failedShards'] == ['test/2024-02/']
+    assert body['statistics']['copiedObjects'] == 2
+    assert body['complete'] is False
+
+def test_full_sync_uses_manifest_instead_of_destination_listing(mock_s3_client):
+    """Test that a second full_sync diffs against the stored manifest and copies only the delta"""
+    event = {**MOCK_FULL_SYNC_EVENT, 'manifest': True}
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(event, None)
+        assert json.loads(response['body'])['statistics']['copiedObjects'] == 2
+        
+        manifest = load_manifest(mock_s3_client, 'dest-bucket', '.sync-state/source-bucket/test%2F/full_sync.manifest.json.gz')
+        assert manifest['test/file1.txt'] == {'ETag': '"123456789"', 'Size': 1000, 'LastModified': None}
+        
+        # A changed and a new source object; the destination listing must not be needed
+        mock_s3_client.listings['source-bucket'][0]['Contents'][1]['ETag'] = '"changed"'
+        mock_s3_client.listings['source-bucket'][0]['Contents'].append(
+            {'Key': 'test/file3.txt', 'ETag': '"3"', 'Size': 3}
+        )
+        del mock_s3_client.listings['dest-bucket']
+        mock_s3_client.copy_object.reset_mock()
+        
+        response = full_sync_handler(event, None)
+        stats = json.loads(response['body'])['statistics']
+        assert stats['copiedObjects'] == 2
+        assert stats['skippedObjects'] == 1
+        assert sorted(call[1]['Key'] for call in mock_s3_client.copy_object.call_args_list) == [
+            'test/file2.txt', 'test/file3.txt'
+        ]
+
+def test_full_sync_watermark_skips_old_objects(mock_s3_client):
+    """Test that watermark runs skip objects older than the last fully synced LastModified"""
+    def listed(key, day):
+        return {'Key': key, 'ETag': f'"{day}"', 'Size': 1, 'LastModified': datetime(2024, 1, day, tzinfo=timezone.utc)}
+    
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [listed('test/a.txt', 1), listed('test/b.txt', 2)]}]
+    event = {**MOCK_FULL_SYNC_EVENT, 'watermark': True, 'manifest': True}
+    watermark_key = '.sync-state/source-bucket/test%2F/full_sync.watermark.json'
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        full_sync_handler(event, None)
+        assert json.loads(mock_s3_client.objects[watermark_key])['watermark'] == '2024-01-01T23:00:00+00:00'
+        
+        # Only objects at or after the watermark are considered on the next run
+        mock_s3_client.listings['source-bucket'][0]['Contents'].append(listed('test/c.txt', 3))
+        mock_s3_client.copy_object.reset_mock()
+        response = full_sync_handler(event, None)
+        stats = json.loads(response['body'])['statistics']
+        assert stats['totalObjects'] == 3
+        assert stats['copiedObjects'] == 1
+        assert mock_s3_client.copy_object.call_args[1]['Key'] == 'test/c.txt'
+        assert json.loads(mock_s3_client.objects[watermark_key])['watermark'] == '2024-01-02T23:00:00+00:00'
+        
+        # An explicit 'since' re-syncs from that point without moving the stored watermark
+        mock_s3_client.copy_object.reset_mock()
+        full_sync_handler({**event, 'since': '2024-01-01T00:00:00Z', 'refreshManifest': True}, None)
+        assert mock_s3_client.copy_object.call_count == 3
+        assert json.loads(mock_s3_client.objects[watermark_key])['watermark'] == '2024-01-02T23:00:00+00:00'
+
+def test_full_sync_watermark_held_back_by_failures(mock_s3_client):
+    """Test that the watermark does not move past an object whose copy failed"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': f'test/{day}.txt', 'ETag': '"1"', 'Size': 1, 'LastModified': datetime(2024, 1, day, tzinfo=timezone.utc)}
+        for day in (1, 2, 3)
+    ]}]
+    def copy_object_side_effect(**kwargs):
+        if kwargs['Key'] == 'test/2.txt':
+            raise Exception("S3 Error")
+        return {}
+    mock_s3_client.copy_object.side_effect = copy_object_side_effect
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        full_sync_handler({**MOCK_FULL_SYNC_EVENT, 'watermark': True}, None)
+    
+    state = json.loads(mock_s3_client.objects['.sync-state/source-bucket/test%2F/full_sync.watermark.json'])
+    assert state['watermark'] == '2024-01-01T23:00:00+00:00'
+
+def test_full_sync_watermark_overlap_catches_late_multipart_uploads(mock_s3_client):
+    """Test that an upload started before a watermark run but completed after it is synced next time"""
+    def listed(key, modified):
+        return {'Key': key, 'ETag': f'"{key}"', 'Size': 1, 'LastModified': modified}
+    
+    newest = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [listed('test/a.txt', newest)]}]
+    event = {**MOCK_FULL_SYNC_EVENT, 'watermark': True, 'manifest': True}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        full_sync_handler(event, None)
+        
+        # The multipart upload started 10 minutes before the newest object but completed later
+        mock_s3_client.listings['source-bucket'][0]['Contents'].append(
+            listed('test/b-late.txt', newest - timedelta(minutes=10))
+        )
+        mock_s3_client.copy_object.reset_mock()
+        full_sync_handler(event, None)
+    
+    assert [call.kwargs['Key'] for call in mock_s3_client.copy_object.call_args_list] == ['test/b-late.txt']
+
+def test_client_pool_reuses_regional_clients(mock_s3_client):
+    """Test that pooled clients are created once per region with tuned configuration"""
+    with patch('boto3.client', return_value=mock_s3_client) as mock_client:
+        assert get_s3_client('us-east-1') is get_s3_client('us-east-1')
+        get_s3_client('eu-west-1')
+        assert mock_client.call_count == 2
+        config = mock_client.call_args[1]['config']
+        assert config.retries['mode'] == 'adaptive'
+        assert config.max_pool_connections >= 16
+
+def test_bucket_region_is_resolved_once(mock_s3_client):
+    """Test that the destination bucket region is looked up once and cached"""
+    with patch('boto3.client', return_value=mock_s3_client) as mock_client:
+        get_bucket_client('dest-bucket', 'us-east-1')
+        get_bucket_client('dest-bucket', 'us-east-1')
+        mock_s3_client.head_bucket.assert_called_once_with(Bucket='dest-bucket')
+        regions = [call[1]['region_name'] for call in mock_client.call_args_list]
+        assert regions == ['us-east-1', 'eu-west-1']
+
+def test_object_sync_verifies_from_copy_response(mock_s3_client):
+    """Test that a matching CopyObject ETag verifies the copy without any HEAD calls"""
+    record = make_sqs_record('message-1', 'test/file.txt')
+    message = json.loads(json.loads(record['body'])['Message'])
+    message['detail']['object'].update({'size': 1000, 'etag': '123456789'})
+    record['body'] = json.dumps({'Message': json.dumps(message)})
+    mock_s3_client.copy_object.return_value = {'CopyObjectResult': {'ETag': '"123456789"'}}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler({'Records': [record]}, None)
+    
+    assert response['statusCode'] == 200
+    mock_s3_client.head_object.assert_not_called()
+    mock_s3_client.copy_object.assert_called_once()
+
+def test_object_sync_checksum_and_head_fallback(mock_s3_client):
+    """Test checksum verification and the HEAD fallback for ambiguous copy responses"""
+    with patch('sync.object_sync.CHECKSUM_ALGORITHM', 'CRC32C'):
+        assert verify_copy(mock_s3_client, 'dest-bucket', 'test/file.txt', 1000, 'abc',
+                           {'ETag': '"other"', 'ChecksumCRC32C': 'AAAAAA=='}) == 'checksum'
+    mock_s3_client.head_object.assert_not_called()
+    
+    # A multipart-style ETag is ambiguous, so the destination size is checked
+    assert verify_copy(mock_s3_client, 'dest-bucket', 'test/file.txt', 1000, 'abc', {'ETag': '"def-2"'}) == 'head'
+    with pytest.raises(ValueError):
+        verify_copy(mock_s3_client, 'dest-bucket', 'test/file.txt', 5, 'abc', {'ETag': '"def-2"'})
+
+def test_object_sync_coalesces_notifications(mock_s3_client):
+    """Test that only the latest notification per key is copied, within a batch and across batches"""
+    event = {'Records': [
+        make_sqs_record('message-1', 'test/cur.parquet', etag='v1', sequencer='0A'),
+        make_sqs_record('message-2', 'test/cur.parquet', etag='v3', sequencer='0C'),
+        make_sqs_record('message-3', 'test/cur.parquet', etag='v2', sequencer='0B'),
+        make_sqs_record('message-4', 'test/other.parquet', etag='o1', sequencer='01')
+    ]}
+    mock_s3_client.copy_object.return_value = {'CopyObjectResult': {'ETag': '"v3"'}}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler(event, None)
+        assert response['batchItemFailures'] == []
+        copies = {call[1]['Key']: call[1]['CopySourceIfMatch'] for call in mock_s3_client.copy_object.call_args_list}
+        assert copies == {'test/cur.parquet': '"v3"', 'test/other.parquet': '"o1"'}
+        
+        # A redelivered or older notification inside the coalescing window is acknowledged without work
+        mock_s3_client.copy_object.reset_mock()
+        response = object_sync_handler({'Records': [
+            make_sqs_record('message-5', 'test/cur.parquet', etag='v2', sequencer='0B')
+        ]}, None)
+        assert response['batchItemFailures'] == []
+        mock_s3_client.copy_object.assert_not_called()
+
+def test_object_sync_compares_padded_sequencers(mock_s3_client):
+    """Test that sequencers of different lengths are compared after right-padding with zeros"""
+    # '0100' pads to '0100' and 'FF' to 'FF00', so 'FF' is the later event
+    event = {'Records': [
+        make_sqs_record('message-1', 'test/cur.parquet', etag='old', sequencer='0100'),
+        make_sqs_record('message-2', 'test/cur.parquet', etag='new', sequencer='FF')
+    ]}
+    mock_s3_client.copy_object.return_value = {'CopyObjectResult': {'ETag': '"old"'}}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        object_sync_handler({'Records': event['Records'][:1]}, None)
+        
+        # A newer but shorter sequencer is not mistaken for a copy already made
+        mock_s3_client.copy_object.reset_mock()
+        mock_s3_client.copy_object.return_value = {'CopyObjectResult': {'ETag': '"new"'}}
+        object_sync_handler({'Records': event['Records'][1:]}, None)
+        assert mock_s3_client.copy_object.call_args[1]['CopySourceIfMatch'] == '"new"'
+        
+        reset_recent_copies()
+        mock_s3_client.copy_object.reset_mock()
+        response = object_sync_handler({'Records': event['Records']}, None)
+        assert response['batchItemFailures'] == []
+        mock_s3_client.copy_object.assert_called_once()
+        assert mock_s3_client.copy_object.call_args[1]['CopySourceIfMatch'] == '"new"'
+
+def test_object_sync_acknowledges_superseded_source(mock_s3_client):
+    """Test that a copy rejected because the source was rewritten is not retried"""
+    mock_s3_client.copy_object.side_effect = ClientError(
+        {'Error': {'Code': 'PreconditionFailed'}}, 'CopyObject'
+    )
+    event = {'Records': [make_sqs_record('message-1', 'test/cur.parquet', etag='v1', sequencer='0A')]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = object_sync_handler(event, None)
+    
+    assert response['statusCode'] == 200
+    assert response['batchItemFailures'] == []
+
+def test_full_sync_mirror_deletes_removed_objects(mock_s3_client):
+    """Test that mirror mode deletes destination objects missing from the source in batches"""
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': [
+        {'Key': 'test/file1.txt', 'ETag': '"123456789"', 'Size': 1000},
+        {'Key': 'test/old1.txt', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/old2.txt', 'ETag': '"1"', 'Size': 1}
+    ]}]
+    mock_s3_client.delete_objects.return_value = {'Errors': [{'Key': 'test/old2.txt', 'Code': 'AccessDenied'}]}
+    event = {**MOCK_FULL_SYNC_EVENT, 'mirror': True}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        # Dry runs and runs above the safety cap report without deleting
+        body = json.loads(full_sync_handler({**event, 'dryRun': True}, None)['body'])
+        assert body['mirror']['staleObjects'] == 2
+        assert body['mirror']['sample'] == ['test/old1.txt', 'test/old2.txt']
+        body = json.loads(full_sync_handler({**event, 'maxDeletes': 1, 'refreshManifest': True}, None)['body'])
+        assert body['mirror']['capExceeded'] is True
+        mock_s3_client.delete_objects.assert_not_called()
+        
+        body = json.loads(full_sync_handler({**event, 'refreshManifest': True}, None)['body'])
+    
+    delete = mock_s3_client.delete_objects.call_args[1]
+    assert delete['Bucket'] == 'dest-bucket'
+    assert delete['Delete']['Objects'] == [{'Key': 'test/old1.txt'}, {'Key': 'test/old2.txt'}]
+    assert body['mirror']['deletedObjects'] == 1
+    assert body['mirror']['failedDeletes'] == 1
+
+def test_full_sync_mirror_does_not_resume_plain_checkpoint(mock_s3_client):
+    """Test that a mirror run ignores a plain run's checkpoint instead of deleting keys listed before it"""
+    mock_s3_client.listings['source-bucket'] = [
+        {'Contents': [{'Key': f'test/page{page}/file{i}.txt', 'ETag': '"1"', 'Size': 1} for i in range(3)]}
+        for page in range(3)
+    ]
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': [
+        {'Key': 'test/old.txt', 'ETag': '"1"', 'Size': 1},
+        {'Key': 'test/page0/file0.txt', 'ETag': '"1"', 'Size': 1}
+    ]}]
+    mock_s3_client.delete_objects.return_value = {}
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 1000
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        body = json.loads(full_sync_handler(MOCK_FULL_SYNC_EVENT, context)['body'])
+        assert body['complete'] is False
+        checkpoint = json.loads(mock_s3_client.objects['.sync-state/source-bucket/test%2F/full_sync.checkpoint.json'])
+        assert checkpoint['lastKey'] == 'test/page0/file0.txt'
+        assert checkpoint['mirror'] is False
+        
+        context.get_remaining_time_in_millis.return_value = 900000
+        body = json.loads(full_sync_handler({**MOCK_FULL_SYNC_EVENT, 'mirror': True}, context)['body'])
+    
+    assert body['complete'] is True
+    assert body['statistics']['totalObjects'] == 9
+    deleted = [obj['Key'] for call in mock_s3_client.delete_objects.call_args_list for obj in call.kwargs['Delete']['Objects']]
+    assert deleted == ['test/old.txt']
+
+def test_mirror_deletes_in_batches_of_1000(mock_s3_client):
+    """Test that DeleteObjects is called with at most 1000 keys"""
+    mock_s3_client.delete_objects.return_value = {}
+    index = {f'test/{i:05d}.txt': {} for i in range(2500)}
+    
+    result = mirror_destination(mock_s3_client, 'dest-bucket', index, set(), max_deletes=5000)
+    
+    sizes = [len(call[1]['Delete']['Objects']) for call in mock_s3_client.delete_objects.call_args_list]
+    assert sizes == [1000, 1000, 500]
+    assert result['deletedObjects'] == 2500
+    assert index == {}
+
+def test_full_sync_checksum_aware_comparison(mock_s3_client):
+    """Test that equal-size objects with differing ETags are matched by recorded ETag or checksums"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/changed.parquet', 'ETag': '"ghi-3"', 'Size': 100},
+        {'Key': 'test/checksummed.parquet', 'ETag': '"def-3"', 'Size': 100},
+        {'Key': 'test/tagged.parquet', 'ETag': '"abc-3"', 'Size': 100}
+    ]}]
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': [
+        {'Key': 'test/changed.parquet', 'ETag': '"333"', 'Size': 100},
+        {'Key': 'test/checksummed.parquet', 'ETag': '"222"', 'Size': 100},
+        {'Key': 'test/tagged.parquet', 'ETag': '"111"', 'Size': 100}
+    ]}]
+    
+    def get_object_tagging_side_effect(**kwargs):
+        if kwargs['Key'] == 'test/tagged.parquet':
+            return {'TagSet': [{'Key': 'source-etag', 'Value': 'abc-3'}]}
+        return {'TagSet': []}
+    
+    def get_object_attributes_side_effect(**kwargs):
+        if kwargs['Key'] == 'test/changed.parquet' and kwargs['Bucket'] == 'dest-bucket':
+            return {'Checksum': {'ChecksumSHA256': 'old'}}
+        return {'Checksum': {'ChecksumSHA256': 'same'}}
+    
+    mock_s3_client.get_object_tagging.side_effect = get_object_tagging_side_effect
+    mock_s3_client.get_object_attributes.side_effect = get_object_attributes_side_effect
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
+    
+    stats = json.loads(response['body'])['statistics']
+    assert stats['skippedObjects'] == 2
+    assert stats['copiedObjects'] == 1
+    copy = mock_s3_client.copy_object.call_args[1]
+    assert copy['Key'] == 'test/changed.parquet'
+    assert copy['Tagging'] == 'source-etag=ghi-3'
+    assert copy['TaggingDirective'] == 'REPLACE'
+
+def test_plan_action_reports_without_copying(mock_s3_client):
+    """Test that the plan action categorises objects and estimates duration without copying"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/new.parquet', 'ETag': '"1"', 'Size': 300},
+        {'Key': 'test/changed.parquet', 'ETag': '"2"', 'Size': 200},
+        {'Key': 'test/same.parquet', 'ETag': '"3"', 'Size': 100}
+    ]}]
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': [
+        {'Key': 'test/changed.parquet', 'ETag': '"old"', 'Size': 150},
+        {'Key': 'test/same.parquet', 'ETag': '"3"', 'Size': 100},
+        {'Key': 'test/removed.parquet', 'ETag': '"4"', 'Size': 50}
+    ]}]
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = handler({**MOCK_FULL_SYNC_EVENT, 'action': 'plan', 'sampleSize': 5, 'concurrency': 8}, None)
+    
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['plan']['new'] == {'objects': 1, 'bytes': 300}
+    assert body['plan']['changed'] == {'objects': 1, 'bytes': 200}
+    assert body['plan']['identical'] == {'objects': 1, 'bytes': 100}
+    assert body['plan']['wouldDelete'] == {'objects': 1, 'bytes': 50}
+    assert body['samples']['wouldDelete'] == ['test/removed.parquet']
+    assert body['estimate']['copyObjects'] == 2
+    estimates = body['estimate']['estimatedSecondsByConcurrency']
+    assert estimates['1'] >= estimates['8'] >= estimates['64']
+    mock_s3_client.copy_object.assert_not_called()
+    mock_s3_client.put_object.assert_not_called()
+
+def test_plan_action_follows_manifest_and_since(mock_s3_client):
+    """Test that the plan only uses the manifest on manifest runs and skips objects before 'since'"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/new.parquet', 'ETag': '"1"', 'Size': 300, 'LastModified': '2024-05-02T00:00:00+00:00'},
+        {'Key': 'test/old.parquet', 'ETag': '"2"', 'Size': 200, 'LastModified': '2024-04-01T00:00:00+00:00'}
+    ]}]
+    save_manifest(mock_s3_client, 'dest-bucket', '.sync-state/source-bucket/test%2F/full_sync.manifest.json.gz', {
+        'test/new.parquet': {'ETag': '"1"', 'Size': 300, 'LastModified': '2024-05-02T00:00:00+00:00'}
+    })
+    event = {**MOCK_FULL_SYNC_EVENT, 'action': 'plan'}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        plans = [json.loads(handler({**event, **settings}, None)['body'])['plan'] for settings in (
+            {}, {'manifest': True}, {'since': '2024-05-01T00:00:00'}
+        )]
+    
+    assert plans[0]['new']['objects'] == 2
+    assert plans[1]['identical']['objects'] == 1
+    assert plans[1]['new']['objects'] == 1
+    assert plans[2]['beforeWatermark'] == {'objects': 1, 'bytes': 200}
+    assert plans[2]['new'] == {'objects': 1, 'bytes': 300}
+
+def test_adaptive_limiter_aimd():
+    """Test that the limiter halves on throttling and grows back additively on success"""
+    limiter = AdaptiveLimiter(16, maximum=32)
+    slow_down = ClientError({'Error': {'Code': 'SlowDown'}, 'ResponseMetadata': {'HTTPStatusCode': 503}}, 'CopyObject')
+    attempts = []
+    
+    def operation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise slow_down
+        return 'ok'
+    
+    with patch('sync.throttle.time.sleep') as sleep:
+        assert limiter.run(operation) == 'ok'
+    
+    assert len(attempts) == 2
+    sleep.assert_called_once()
+    assert limiter.statistics() == {'concurrencyLimit': 8, 'throttledRequests': 1, 'serverErrors': 0}
+    
+    for _ in range(40):
+        limiter.acquire()
+        limiter.release()
+    assert 8 < limiter.statistics()['concurrencyLimit'] <= 32
+
+def test_adaptive_limiter_failures_do_not_raise_limit():
+    """Test that non-retryable errors leave the limit unchanged and server errors are not counted as throttling"""
+    limiter = AdaptiveLimiter(8, maximum=32)
+    access_denied = ClientError({'Error': {'Code': 'AccessDenied'}, 'ResponseMetadata': {'HTTPStatusCode': 403}},
+                                'CopyObject')
+    internal_error = ClientError({'Error': {'Code': 'InternalError'}, 'ResponseMetadata': {'HTTPStatusCode': 500}},
+                                 'CopyObject')
+    
+    def fail(error):
+        raise error
+    
+    for _ in range(20):
+        with pytest.raises(ClientError):
+            limiter.run(lambda: fail(access_denied))
+    assert limiter.statistics() == {'concurrencyLimit': 8, 'throttledRequests': 0, 'serverErrors': 0}
+    
+    with pytest.raises(ClientError):
+        limiter.run(lambda: fail(internal_error))
+    assert limiter.statistics() == {'concurrencyLimit': 4, 'throttledRequests': 0, 'serverErrors': 1}
+
+def test_full_sync_retries_throttled_copies(mock_s3_client):
+    """Test that SlowDown responses are retried instead of counting as failed copies"""
+    calls = []
+    
+    def copy_object_side_effect(**kwargs):
+        calls.append(kwargs['Key'])
+        if calls.count(kwargs['Key']) == 1:
+            raise ClientError({'Error': {'Code': 'SlowDown'}}, 'CopyObject')
+        return {}
+    mock_s3_client.copy_object.side_effect = copy_object_side_effect
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}), patch('sync.throttle.time.sleep'):
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
+    
+    body = json.loads(response['body'])
+    assert body['statistics']['copiedObjects'] == 2
+    assert body['statistics']['failedObjects'] == 0
+    assert body['throttle']['throttledRequests'] == 2
+
+def test_prefetch_pages_is_bounded():
+    """Test that the listing producer preserves order and blocks once the queue is full"""
+    produced = []
+    
+    def pages():
+        for number in range(100):
+            produced.append(number)
+            yield {'page': number}
+    
+    prefetched = prefetch_pages(pages(), depth=2)
+    assert next(prefetched) == {'page': 0}
+    time.sleep(0.05)
+    # One page handed over, two queued and one waiting to be put
+    assert len(produced) <= 4
+    assert [page['page'] for page in prefetched] == list(range(1, 100))
+
+def test_prefetch_pages_raises_listing_errors():
+    """Test that a listing error in the producer is raised in the consumer"""
+    def pages():
+        yield {'page': 0}
+        raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'ListObjectsV2')
+    
+    prefetched = prefetch_pages(pages())
+    assert next(prefetched) == {'page': 0}
+    with pytest.raises(ClientError):
+        next(prefetched)
+
+def test_full_sync_merges_sorted_listings(mock_s3_client):
+    """Test that runs without a manifest merge the source and destination listings page by page"""
+    mock_s3_client.listings['source-bucket'] = [
+        {'Contents': [{'Key': f'test/{name}.txt', 'ETag': '"1"', 'Size': 1} for name in ('a', 'c')]},
+        {'Contents': [{'Key': f'test/{name}.txt', 'ETag': '"1"', 'Size': 1} for name in ('e', 'f')]}
+    ]
+    mock_s3_client.listings['dest-bucket'] = [
+        {'Contents': [{'Key': 'test/a.txt', 'ETag': '"1"', 'Size': 1}, {'Key': 'test/b.txt', 'ETag': '"1"', 'Size': 1}]},
+        {'Contents': [{'Key': 'test/d.txt', 'ETag': '"1"', 'Size': 1}, {'Key': 'test/e.txt', 'ETag': '"2"', 'Size': 1}]},
+        {'Contents': [{'Key': 'test/f.txt', 'ETag': '"1"', 'Size': 1}]}
+    ]
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}), \
+            patch('sync.full_sync.build_destination_index') as build_destination_index:
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
+    
+    stats = json.loads(response['body'])['statistics']
+    assert stats == {'totalObjects': 4, 'copiedObjects': 2, 'skippedObjects': 2, 'failedObjects': 0}
+    copied = sorted(call.kwargs['Key'] for call in mock_s3_client.copy_object.call_args_list)
+    assert copied == ['test/c.txt', 'test/e.txt']
+    build_destination_index.assert_not_called()
+    assert mock_s3_client.objects == {}
+
+def test_full_sync_pipelines_pages(mock_s3_client):
+    """Test that copies of several pages are all collected before the sync completes"""
+    mock_s3_client.listings['source-bucket'] = [
+        {'Contents': [{'Key': f'test/page{page}/file{i}.txt', 'ETag': f'"{page}-{i}"', 'Size': 10} for i in range(3)]}
+        for page in range(5)
+    ]
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(MOCK_FULL_SYNC_EVENT, None)
+    
+    body = json.loads(response['body'])
+    assert body['complete'] is True
+    assert body['statistics']['totalObjects'] == 15
+    assert body['statistics']['copiedObjects'] == 15
+    assert mock_s3_client.copy_object.call_count == 15
+
+def get_emf_documents(output):
+    """Parse the Embedded Metric Format documents printed to stdout"""
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{"_aws"')]
+
+def test_object_sync_emits_metrics(mock_s3_client, capsys):
+    """Test that object_sync writes one EMF document per source bucket and top-level prefix"""
+    mock_s3_client.copy_object.return_value = {'CopyObjectResult': {'ETag': '"abc"'}}
+    event = {'Records': [
+        make_sqs_record('message-1', 'daily/a.csv', size=100, etag='abc'),
+        make_sqs_record('message-2', 'daily/b.csv', size=50, etag='abc'),
+        make_sqs_record('message-3', 'monthly/c.csv', size=10, etag='abc')
+    ]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        object_sync_handler(event, None)
+    
+    documents = {doc['Prefix']: doc for doc in get_emf_documents(capsys.readouterr().out)}
+    assert set(documents) == {'daily/', 'monthly/'}
+    daily = documents['daily/']
+    assert daily['Operation'] == 'object_sync'
+    assert daily['SourceBucket'] == 'source-bucket'
+    assert daily['ObjectsCopied'] == 2
+    assert daily['BytesCopied'] == 150
+    assert 'CopyLatencyP99' in daily
+    metric_names = [metric['Name'] for metric in daily['_aws']['CloudWatchMetrics'][0]['Metrics']]
+    assert 'ObjectsPerSecond' in metric_names and 'ThrottledRequests' in metric_names
+    assert 'HeadRequests' not in metric_names
+    
+    # Process-wide API call counts are reported once per batch, per operation only
+    with_calls = [doc for doc in documents.values() if 'HeadRequests' in doc]
+    assert len(with_calls) == 1
+    directive = with_calls[0]['_aws']['CloudWatchMetrics'][1]
+    assert directive['Dimensions'] == [['Operation']]
+    assert [metric['Name'] for metric in directive['Metrics']] == ['HeadRequests', 'ListRequests']
+
+def test_sync_metrics_lag_and_api_calls():
+    """Test that sync lag comes from the event time and API calls from the client hook"""
+    metrics = SyncMetrics('object_sync', 'source-bucket', 'daily/')
+    metrics.record_copy(20, 100, '2020-01-01T00:00:00Z')
+    for _ in range(3):
+        record_api_call(SimpleNamespace(name='ListObjectsV2'))
+    record_api_call(SimpleNamespace(name='HeadObject'))
+    
+    values = metrics.values()
+    assert values['SyncLagMax'][0] > 0
+    assert values['ListRequests'][0] == 3
+    assert values['HeadRequests'][0] == 1
+    assert percentile([5, 1, 3, 2, 4], 0.5) == 3
+
+def test_benchmark_scenarios_run():
+    """Test that the benchmark suite runs every scenario against the in-memory S3"""
+    from benchmarks.run import run_benchmarks
+    
+    results = run_benchmarks([200], latency_ms=0)
+    
+    assert set(results) == {'full_sync_initial/200', 'full_sync_rerun/200', 'object_sync/200'}
+    assert results['full_sync_initial/200']['apiCalls']['CopyObject'] > 0
+    assert results['full_sync_rerun/200'].get('apiCalls', {}).get('CopyObject', 0) == 0
+    assert results['object_sync/200']['apiCallsPerObject'] >= 1
+
+INVENTORY_SCHEMA = 'Bucket, Key, Size, LastModifiedDate, ETag, IsLatest, IsDeleteMarker'
+
+def make_inventory_csv(rows):
+    """Build a gzip compressed CSV inventory report from (key, size, etag) rows"""
+    lines = [f'"bucket","{key}","{size}","2024-05-01T00:00:00.000Z","{etag}","true","false"' for key, size, etag in rows]
+    return gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+
+def test_iter_inventory_file_parses_local_csv(tmp_path):
+    """Test that a local CSV inventory file is parsed into listing shaped objects"""
+    report = make_inventory_csv([('test/a+b%2Fc.csv', 10, 'abc'), ('other/file.csv', 5, 'def')])
+    report += gzip.compress(b'"bucket","test/old.csv","1","2024-05-01T00:00:00.000Z","x","false","false"\n')
+    path = tmp_path / 'inventory.csv.gz'
+    path.write_bytes(report)
+    
+    with open(path, 'rb') as stream:
+        objects = list(iter_inventory_file(stream, 'CSV', INVENTORY_SCHEMA, prefix='test/'))
+    
+    assert objects == [{
+        'Key': 'test/a b/c.csv',
+        'Size': 10,
+        'ETag': '"abc"',
+        'LastModified': '2024-05-01T00:00:00.000Z'
+    }]
+
+def test_iter_inventory_file_parses_local_parquet(tmp_path):
+    """Test that a local Parquet inventory file is parsed into listing shaped objects"""
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as parquet
+    path = tmp_path / 'inventory.parquet'
+    parquet.write_table(pyarrow.table({
+        'bucket': ['bucket', 'bucket'],
+        'key': ['test/a.csv', 'test/deleted.csv'],
+        'size': [10, 0],
+        'e_tag': ['abc', None],
+        'is_latest': [True, True],
+        'is_delete_marker': [False, True]
+    }), path)
+    
+    with open(path, 'rb') as stream:
+        objects = list(iter_inventory_file(stream, 'Parquet', prefix='test/'))
+    
+    assert objects == [{'Key': 'test/a.csv', 'Size': 10, 'ETag': '"abc"', 'LastModified': None}]
+
+def put_inventory(mock_s3, name, rows, files=1):
+    """Store an inventory manifest and its CSV reports in the mocked S3"""
+    chunk = -(-len(rows) // files)
+    keys = []
+    for number in range(files):
+        keys.append(f'inventory/{name}/data/{number}.csv.gz')
+        mock_s3.objects[keys[-1]] = make_inventory_csv(rows[number * chunk:(number + 1) * chunk])
+    mock_s3.objects[f'inventory/{name}/manifest.json'] = json.dumps({
+        'sourceBucket': name,
+        'fileFormat': 'CSV',
+        'fileSchema': INVENTORY_SCHEMA,
+        'files': [{'key': key} for key in keys]
+    }).encode('utf-8')
+    return f's3://inventory-bucket/inventory/{name}/manifest.json'
+
+def test_inventory_pages_resume_from_token(mock_s3_client):
+    """Test that inventory pages span report files and resume from the consumed object count"""
+    uri = put_inventory(mock_s3_client, 'source', [(f'test/{i}.csv', 1, str(i)) for i in range(5)], files=2)
+    
+    pages = list(inventory_pages(mock_s3_client, uri, 'test/', page_size=2))
+    assert [len(page['Contents']) for page in pages] == [2, 2, 1]
+    assert pages[0]['NextContinuationToken'] == '2'
+    
+    resumed = list(inventory_pages(mock_s3_client, uri, 'test/', continuation_token='4', page_size=2))
+    assert [obj['Key'] for page in resumed for obj in page['Contents']] == ['test/4.csv']
+
+def test_full_sync_diffs_inventories_without_listing(mock_s3_client):
+    """Test that full_sync diffs source and destination inventories without any list calls"""
+    source = put_inventory(mock_s3_client, 'source', [('test/same.csv', 10, 'aaa'), ('test/new.csv', 20, 'bbb'),
+                                                      ('test/changed.csv', 30, 'ccc')])
+    destination = put_inventory(mock_s3_client, 'destination', [('test/same.csv', 10, 'aaa'),
+                                                                ('test/changed.csv', 30, 'old')])
+    event = {**MOCK_FULL_SYNC_EVENT, 'sourceInventory': source, 'destinationInventory': destination}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler(event, None)
+    
+    body = json.loads(response['body'])
+    assert body['statistics']['copiedObjects'] == 2
+    assert body['statistics']['skippedObjects'] == 1
+    mock_s3_client.list_objects_v2.assert_not_called()
+    copied = sorted(call.kwargs['Key'] for call in mock_s3_client.copy_object.call_args_list)
+    assert copied == ['test/changed.csv', 'test/new.csv']
+    
+    # Objects created after the inventory snapshot would look stale, so mirror is rejected
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        response = full_sync_handler({**event, 'mirror': True}, None)
+    assert response['statusCode'] == 500
+    mock_s3_client.delete_objects.assert_not_called()
+
+def test_full_sync_delimited_destination_inventory_keeps_nested_keys(mock_s3_client):
+    """Test that a delimited mirror run only treats direct children of the destination inventory as stale"""
+    mock_s3_client.listings['source-bucket'] = [{'Contents': [
+        {'Key': 'test/a.csv', 'ETag': '"aaa"', 'Size': 10},
+        {'Key': 'test/sub/b.csv', 'ETag': '"bbb"', 'Size': 20}
+    ]}]
+    destination = put_inventory(mock_s3_client, 'destination', [('test/a.csv', 10, 'aaa'), ('test/old.csv', 5, 'ddd'),
+                                                                ('test/sub/b.csv', 20, 'bbb')])
+    mock_s3_client.delete_objects.return_value = {}
+    event = {**MOCK_FULL_SYNC_EVENT, 'delimiter': '/', 'mirror': True, 'destinationInventory': destination}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}):
+        body = json.loads(full_sync_handler(event, None)['body'])
+    
+    assert body['statistics']['totalObjects'] == 1
+    assert body['mirror']['staleObjects'] == 1
+    assert mock_s3_client.delete_objects.call_args.kwargs['Delete']['Objects'] == [{'Key': 'test/old.csv'}]
+
+CUR_PERIOD = 'cur/report/20240501-20240601/'
+
+def test_object_sync_copies_latest_cur_assembly(mock_s3_client):
+    """Test that a CUR manifest copies its assembly and removes superseded assemblies"""
+    report_keys = [f'{CUR_PERIOD}assembly-2/report-{part}.csv.gz' for part in (1, 2)]
+    mock_s3_client.objects[f'{CUR_PERIOD}report-Manifest.json'] = json.dumps({
+        'assemblyId': 'assembly-2',
+        'reportKeys': report_keys
+    }).encode('utf-8')
+    mock_s3_client.listings['dest-bucket'] = [{'Contents': [
+        {'Key': f'{CUR_PERIOD}report-Manifest.json'},
+        {'Key': f'{CUR_PERIOD}assembly-1/report-1.csv.gz'},
+        {'Key': f'{CUR_PERIOD}assembly-1/report-Manifest.json'},
+        {'Key': report_keys[0]}
+    ]}]
+    mock_s3_client.delete_objects.return_value = {}
+    event = {'Records': [
+        make_sqs_record('message-1', report_keys[0], size=10),
+        make_sqs_record('message-2', f'{CUR_PERIOD}report-Manifest.json', size=10)
+    ]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}), \
+            patch('sync.object_sync.CUR_MANIFESTS', True):
+        response = object_sync_handler(event, None)
+    
+    assert response['batchItemFailures'] == []
+    copied = [call.kwargs['Key'] for call in mock_s3_client.copy_object.call_args_list]
+    assert sorted(copied[:2]) == report_keys
+    assert copied[2] == f'{CUR_PERIOD}report-Manifest.json'
+    deleted = mock_s3_client.delete_objects.call_args.kwargs['Delete']['Objects']
+    assert deleted == [{'Key': f'{CUR_PERIOD}assembly-1/report-1.csv.gz'},
+                       {'Key': f'{CUR_PERIOD}assembly-1/report-Manifest.json'}]
+
+def test_object_sync_copies_cur_report_files_concurrently(mock_s3_client):
+    """Test that a lone manifest notification copies its report files concurrently"""
+    report_keys = [f'{CUR_PERIOD}assembly-1/report-{part}.csv.gz' for part in range(8)]
+    mock_s3_client.objects[f'{CUR_PERIOD}report-Manifest.json'] = json.dumps({
+        'reportKeys': report_keys
+    }).encode('utf-8')
+    in_flight = {'current': 0, 'peak': 0}
+    lock = threading.Lock()
+    
+    def copy_object_side_effect(**kwargs):
+        with lock:
+            in_flight['current'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['current'])
+        time.sleep(0.05)
+        with lock:
+            in_flight['current'] -= 1
+        return {}
+    
+    mock_s3_client.copy_object.side_effect = copy_object_side_effect
+    event = {'Records': [make_sqs_record('message-1', f'{CUR_PERIOD}report-Manifest.json', size=10)]}
+    
+    with patch.dict('os.environ', {'DESTINATION_BUCKET': 'dest-bucket'}), \
+            patch('sync.object_sync.CUR_MANIFESTS', True):
+        response = object_sync_handler(event, None)
+    
+    assert response['batchItemFailures'] == []
+    assert mock_s3_client.copy_object.call_count == 9
+    assert in_flight['peak'] > 1
+
+def test_find_superseded_keys_for_overwritten_data_export():
+    """Test that parts dropped from an overwritten Data Exports report are superseded"""
+    prefix = 'usage/cur/export/data/BILLING_PERIOD=2024-05/'
+    report_keys = [f'{prefix}export-00001.snappy.parquet']
+    destination_keys = report_keys + [f'{prefix}export-00002.snappy.parquet']
+    
+    superseded = find_superseded_keys(destination_keys, report_keys,
+                                      'usage/cur/export/metadata/BILLING_PERIOD=2024-05/export-Manifest.json')
+    
+    assert superseded == [f'{prefix}export-00002.snappy.parquet']